@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import logging
+import threading
+from functools import lru_cache
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+ASSET_DIRS = ['clip', 'clip_7in5', 'icons', 'icons_7in5']
+WIND_STEP = 10
+
+_images = {}
+_lock = threading.Lock()
+
+def get_image(path):
+    '''
+        Open and decode PNG once, later calls get the decoded image
+    '''
+
+    image = _images.get(path)
+    if image is None:
+        image = Image.open(path, mode='r')
+        image.load()
+        with _lock:
+            image = _images.setdefault(path, image)
+    return image
+
+@lru_cache(maxsize=None)
+def corners(path):
+    '''
+        Corner clip rotated for top left, top right, bottom left and bottom right
+    '''
+
+    corner = get_image(path)
+    return (corner, corner.rotate(270), corner.rotate(90), corner.rotate(180))
+
+def quantize_angle(angle, step = WIND_STEP):
+    return int(round(angle / step) * step) % 360
+
+@lru_cache(maxsize=None)
+def _rotated(path, angle):
+    return get_image(path).rotate(angle)
+
+def rotated(path, angle, step = WIND_STEP):
+    '''
+        Image rotated by angle quantized to step degrees
+    '''
+
+    return _rotated(path, quantize_angle(angle, step))
+
+def preload(root = None, dirs = ASSET_DIRS, step = WIND_STEP):
+    '''
+        Decode every PNG in asset directories and prerender rotations
+    '''
+
+    if root is None:
+        root = os.path.dirname(os.path.realpath(__file__))
+    count = 0
+    for d in dirs:
+        for dirpath, dirnames, filenames in os.walk(os.path.join(root, d)):
+            dirnames[:] = [n for n in dirnames if not n.startswith('_')]
+            for filename in filenames:
+                if filename.endswith('.png'):
+                    get_image(os.path.join(dirpath, filename))
+                    count += 1
+        corner = os.path.join(root, d, 'corner.png')
+        if os.path.isfile(corner):
+            corners(corner)
+        wind = os.path.join(root, d, 'wind_direction.png')
+        if os.path.isfile(wind):
+            for angle in range(0, 360, step):
+                rotated(wind, angle, step)
+    logger.debug('{} images preloaded'.format(count))
+    return count
+
+def cache_clear():
+    _rotated.cache_clear()
+    corners.cache_clear()
+    with _lock:
+        _images.clear()
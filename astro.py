@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import struct
+import logging
+import argparse
+import configparser
+import lunation
+from datetime import datetime, date, time, timedelta
+
+logger = logging.getLogger(__name__)
+
+TABLES_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'astro')
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'config.ini')
+# Table of the next year is built this many days before it starts.
+DAYS_AHEAD = 31
+
+MAGIC = b'PYTOCAST'
+VERSION = 2
+# Table header: magic, version, year, latitude, longitude and UTC offsets
+# of winter and summer local time the days were taken in.
+HEADER = struct.Struct('<8sHHddii')
+# One record per day of year: sunrise, sunset, moonrise, moonset as Unix time,
+# moon day, moon phase id and constellation abbreviation.
+RECORD = struct.Struct('<4dBB3s3x')
+
+def compute(latitude, longitude, instant):
+    '''
+        Record of the day of local datetime instant computed by ephem
+    '''
+
+    import ephem
+
+    btoday = instant.replace(hour=0, minute=0, second=0, microsecond=0)
+    etoday = instant.replace(hour=23, minute=59, second=59, microsecond=999)
+
+    home = ephem.Observer()
+    home.lat, home.lon = latitude, longitude
+    home.date = ephem.Date(datetime.utcfromtimestamp(instant.timestamp()))
+
+    sun = ephem.Sun()
+    sun.compute(home)
+    srp = ephem.localtime(home.previous_rising(sun))
+    srn = ephem.localtime(home.next_rising(sun))
+    ssp = ephem.localtime(home.previous_setting(sun))
+    ssn = ephem.localtime(home.next_setting(sun))
+
+    moon = ephem.Moon()
+    moon.compute(home)
+    mrp = ephem.localtime(home.previous_rising(moon))
+    mrn = ephem.localtime(home.next_rising(moon))
+    msp = ephem.localtime(home.previous_setting(moon))
+    msn = ephem.localtime(home.next_setting(moon))
+
+    moon_day, moon_phase_id = lunation.lookup(instant.timestamp())
+
+    return (
+        (srn if srp < btoday else srp).timestamp(),
+        (ssn if ssn < etoday else ssp).timestamp(),
+        (mrn if mrp < btoday else mrp).timestamp(),
+        (msn if msn < etoday else msp).timestamp(),
+        moon_day,
+        moon_phase_id,
+        ephem.constellation(moon)[0].encode('ascii'))
+
+def utc_offsets(year):
+    '''
+        Seconds of local time ahead of UTC in winter and summer of the year
+    '''
+
+    return tuple(int(datetime(year, month, 1, 12).astimezone().utcoffset().total_seconds()) for month in (1, 7))
+
+def table_path(latitude, longitude, year, path = TABLES_PATH):
+    return os.path.join(path, 'astro_{:.4f}_{:.4f}_{}.bin'.format(float(latitude), float(longitude), year))
+
+def build(latitude, longitude, year, path = TABLES_PATH):
+    '''
+        Precompute table of the year for location, days are taken at local noon
+    '''
+
+    days = date(year, 12, 31).timetuple().tm_yday
+    records = [RECORD.pack(*compute(latitude, longitude, datetime.combine(date.fromordinal(date(year, 1, 1).toordinal() + i), time(12)))) for i in range(days)]
+
+    os.makedirs(path, exist_ok=True)
+    filename = table_path(latitude, longitude, year, path)
+    # Workers of batch may build the same table at once.
+    tmp = '{}.{}.tmp'.format(filename, os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, year, float(latitude), float(longitude), *utc_offsets(year)))
+        f.write(b''.join(records))
+    os.replace(tmp, filename)
+    logger.info('Astronomical table of {} days saved to {}'.format(days, filename))
+    return filename
+
+def lookup(latitude, longitude, day, path = TABLES_PATH):
+    '''
+        Precomputed record of the day, None if there is no table for it
+        or it was built for other location or time zone
+    '''
+
+    try:
+        with open(table_path(latitude, longitude, day.year, path), 'rb') as f:
+            magic, version, year, lat, lon, winter, summer = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION or year != day.year:
+                logger.warning('Astronomical table {} is not valid'.format(f.name))
+                return None
+            if (round(lat, 4), round(lon, 4)) != (round(float(latitude), 4), round(float(longitude), 4)) or (winter, summer) != utc_offsets(year):
+                logger.warning('Astronomical table {} is of other location or time zone'.format(f.name))
+                return None
+            f.seek(HEADER.size + (day.timetuple().tm_yday - 1) * RECORD.size)
+            record = f.read(RECORD.size)
+    except (FileNotFoundError, struct.error):
+        return None
+    if len(record) != RECORD.size:
+        return None
+    return RECORD.unpack(record)
+
+def prepare(latitude, longitude, day = None, path = TABLES_PATH, force = False):
+    '''
+        Build tables of the year of day (today by default) and of the next
+        one if it is DAYS_AHEAD away, unless valid ones are there
+    '''
+
+    day = day or date.today()
+    built = []
+    for year in sorted({day.year, (day + timedelta(days=DAYS_AHEAD)).year}):
+        if force or lookup(latitude, longitude, date(year, 1, 1), path) is None:
+            built.append(build(latitude, longitude, year, path))
+    return built
+
+def location(name = None):
+    '''
+        Latitude and longitude of config location, the current one by default
+    '''
+
+    if not os.path.isfile(CONFIG_FILE):
+        return (55.755864, 37.617698)
+    config = configparser.ConfigParser()
+    config.read(CONFIG_FILE)
+    name = name or config['Common']['CurrentLocation']
+    return (config[name]['Latitude'], config[name]['Longitude'])
+
+def get(latitude, longitude, instant, path = TABLES_PATH):
+    '''
+        Sun and moon info of the day of local datetime instant
+    '''
+
+    record = lookup(latitude, longitude, instant.date(), path)
+    if record is None:
+        logger.debug('No astronomical table for {}, computing'.format(instant.date()))
+        record = compute(latitude, longitude, instant)
+    sunrise, sunset, moonrise, moonset, moon_day, moon_phase_id, constellation = record
+
+    sun_info = {}
+    sun_info['sunrise'] = datetime.fromtimestamp(sunrise)
+    sun_info['sunset'] = datetime.fromtimestamp(sunset)
+    sun_info['daylength'] = sun_info['sunset'] - sun_info['sunrise']
+
+    moon_info = {}
+    moon_info['moonrise'] = datetime.fromtimestamp(moonrise)
+    moon_info['moonset'] = datetime.fromtimestamp(moonset)
+    moon_info['constellation'] = constellation.decode('ascii')
+    moon_info['moon_day'] = moon_day
+    moon_info['moon_phase_id'] = moon_phase_id
+    return sun_info, moon_info
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog='astro.py', description='Precompute astronomical tables missing or outdated')
+    parser.add_argument('-y', '--year', dest='years', help='comma separated years, the current one and the next one close to it by default')
+    parser.add_argument('--location', dest='locations', help='comma separated config locations, current one by default')
+    parser.add_argument('-f', '--force', dest='force', help='build tables even if valid ones are there', action='store_true')
+    parser.add_argument('-o', '--output', dest='path', help='path for tables', default=TABLES_PATH)
+    parser.add_argument('-l', '--log-level', dest='log_level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], default='INFO')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=getattr(logging, args.log_level), format='%(levelname)s - %(name)s - %(message)s')
+
+    names = args.locations.split(',') if args.locations else [None]
+    for latitude, longitude in (location(name) for name in names):
+        if args.years:
+            for year in args.years.split(','):
+                prepare(latitude, longitude, date(int(year), 1, 1), args.path, args.force)
+        else:
+            prepare(latitude, longitude, path=args.path, force=args.force)
@@ -3,52 +3,66 @@
 
 import os
 import logging
-import requests
 from lxml import etree
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
 import textwrap
+import fonts
+import textfit
+import metrics
+import net
+from backpage import pool
 
 logger = logging.getLogger(__name__)
 
 class BashOrg():
 
-    def __init__(self, image_path = ''):
+    def __init__(self, w = 300, h = 400, image_path = ''):
         self.__name = 'bashorg.org'
         p = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')
         self.fonts_path = os.path.join(p, 'fonts')
+        self.w = w
+        self.h = h
         self.image_path = image_path
-        self.session = requests.session()
 
     @property
     def name(self):
         return self.__name
 
-    def get(self):
-        attempt = 0
-        while True:
-            if attempt > 15:
-                raise SystemError('Not found fitting item') 
-            response = self.session.get('http://bashorg.org/casual')
+    def fetch(self):
+        '''
+            Random item, None if it is not ranked high enough or too long
+        '''
+
+        response = net.get('http://bashorg.org/casual')
 
-            tree = etree.HTML(response.content)
+        tree = etree.HTML(response.content)
 
-            url = tree.xpath('//*[@id="quotes"]/div[@class="q"]/div[@class="vote"]/a[4]/@href')[0]
-            title = tree.xpath('//*[@id="quotes"]/div[@class="q"]/div[@class="vote"]/a[4]/text()')[0]
-            date = tree.xpath('//*[@id="quotes"]/div[@class="q"]/div[@class="vote"]/text()')[6]
-            rank = int(tree.xpath('//*[@id="quotes"]/div[@class="q"]/div[@class="vote"]/span[1]/text()')[0])
-            quote_lines = tree.xpath('//*[@id="quotes"]/div[@class="q"]/div[2]/text()')
+        url = tree.xpath('//*[@id="quotes"]/div[@class="q"]/div[@class="vote"]/a[4]/@href')[0]
+        title = tree.xpath('//*[@id="quotes"]/div[@class="q"]/div[@class="vote"]/a[4]/text()')[0]
+        date = tree.xpath('//*[@id="quotes"]/div[@class="q"]/div[@class="vote"]/text()')[6]
+        rank = int(tree.xpath('//*[@id="quotes"]/div[@class="q"]/div[@class="vote"]/span[1]/text()')[0])
+        quote_lines = tree.xpath('//*[@id="quotes"]/div[@class="q"]/div[2]/text()')
 
-            chars = sum([len(line) for line in quote_lines])
+        chars = sum([len(line) for line in quote_lines])
 
-            if rank > 50 and chars < 400:
-                break
-            attempt += 1
-        logger.info('Item for back page found')
-        return (title, date, quote_lines)
+        if rank > 50 and chars < 400:
+            # Lines are lxml strings, plain ones are stored in pool.
+            return (str(title), str(date), [str(line) for line in quote_lines])
+        return None
 
+    @metrics.timed('backpage_get')
+    def get(self):
+        for attempt in range(16):
+            item = self.fetch()
+            if item is not None:
+                logger.info('Item for back page found')
+                return item
+        raise SystemError('Not found fitting item')
+
+    @metrics.timed('backpage_draw')
     def draw(self):
         try:
-            title, date, quote_lines = self.get()
+            title, date, quote_lines = pool.take(self)
         except SystemError as error:
             raise
             logger.error(error)
@@ -62,22 +76,15 @@ class BashOrg():
 
         quote = '\n'.join(quote)
 
-        page_w = 300
-        page_h = 400
+        page_w = self.w
+        page_h = self.h
 
         page = Image.new('1', (page_w, page_h), "white")
         draw = ImageDraw.Draw(page)
 
-        font_size = 24
-        font = ImageFont.truetype(os.path.join(self.fonts_path, 'Cousine-Regular.ttf'), font_size)
-        quote_w, quote_h = draw.textsize(quote, font=font)
-
-        while quote_w > 290 or quote_h > 390:
-            logger.debug('wrapped text doesn\'t fit {} {}'.format(quote_w, quote_h))
-            logger.debug('font size {}'.format(font_size))
-            font_size -=2
-            font = ImageFont.truetype(os.path.join(self.fonts_path, 'Cousine-Regular.ttf'), font_size)
-            quote_w, quote_h = draw.textsize(quote, font=font)
+        font_name = os.path.join(self.fonts_path, 'Cousine-Regular.ttf')
+        font_size, quote_w, quote_h = textfit.fit_fontsize(font_name, quote, 290, 390, 24)
+        font = fonts.get_font(font_name, font_size)
 
         logger.debug('now wrapped text fits {} {}'.format(quote_w, quote_h))
         logger.debug('font size {}'.format(font_size))
@@ -88,5 +95,5 @@ class BashOrg():
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.DEBUG)
-    bashorg = BashOrg(os.path.dirname(os.path.realpath(__file__)))
+    bashorg = BashOrg(image_path = os.path.dirname(os.path.realpath(__file__)))
     bashorg.draw()
\ No newline at end of file
@@ -3,10 +3,10 @@
 
 import os
 import logging
-import requests
-from lxml import html
-from PIL import Image, ImageDraw, ImageFont
-import textwrap
+from PIL import Image, ImageDraw
+import fonts
+import textfit
+import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -25,10 +25,12 @@ class Dummy():
     def name(self):
         return self.__name
 
+    @metrics.timed('backpage_get')
     def get(self):
         text = "Dummy text"
         return (text)
 
+    @metrics.timed('backpage_draw')
     def draw(self):
         try:
             text = self.get()
@@ -42,13 +44,13 @@ class Dummy():
 
         draw.rectangle((5, 5, self.w-5, self.h-5), outline = 'black', fill='white')
 
+        text_fontname = os.path.join(self.fonts_path, 'Cuprum-Regular.ttf')
         text_font_size = 30
-        text_font = ImageFont.truetype(os.path.join(self.fonts_path, 'Cuprum-Regular.ttf'), text_font_size)
-        text_w, text_h = draw.textsize(text, font=text_font)
-        while text_w > self.w :
-            text_font_size -=2
-            text_font = ImageFont.truetype(os.path.join(self.fonts_path, 'Cousine-Regular.ttf'), text_font_size)
-            text_w, text_h = draw.textsize(text, font=text_font)
+        text_w, text_h = fonts.textsize(text_fontname, text_font_size, text)
+        if text_w > self.w:
+            text_fontname = os.path.join(self.fonts_path, 'Cousine-Regular.ttf')
+            text_font_size, text_w, text_h = textfit.fit_fontsize(text_fontname, text, self.w, None, text_font_size - 2)
+        text_font = fonts.get_font(text_fontname, text_font_size)
 
         draw.text(((self.w-text_w)/2, (self.h-text_h)/2), text, font=text_font, fill='black')
 
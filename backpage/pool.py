@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import logging
+from PIL import Image
+import metrics
+
+logger = logging.getLogger(__name__)
+
+POOL_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'pool')
+# Items kept ready per backpage.
+SIZE = 5
+# Fetches per missing item, as not every one fits.
+ATTEMPTS = 4
+# Seconds after which files of item without JSON are left by killed process.
+ORPHAN_AGE = 600
+
+class Pool:
+    '''
+        Items of backpage fetched ahead, stored as JSON with images in PNG files
+        next to it. Item is complete once its JSON file exists
+    '''
+
+    def __init__(self, name, path = POOL_PATH):
+        self.path = os.path.join(path, name)
+
+    def __len__(self):
+        try:
+            return sum(1 for f in os.listdir(self.path) if f.endswith('.json'))
+        except FileNotFoundError:
+            return 0
+
+    def put(self, item):
+        os.makedirs(self.path, exist_ok=True)
+        # Time ordered, so the oldest item is taken first.
+        item_id = '{}_{}'.format(time.time_ns(), uuid.uuid4().hex[:8])
+        fields = []
+        for i, value in enumerate(item):
+            if isinstance(value, Image.Image):
+                filename = '{}_{}.png'.format(item_id, i)
+                value.save(os.path.join(self.path, filename))
+                fields.append({'image': filename})
+            else:
+                fields.append(value)
+        filename = os.path.join(self.path, item_id + '.json')
+        with open(filename + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(fields, f, ensure_ascii=False)
+        os.replace(filename + '.tmp', filename)
+
+    def pop(self):
+        '''
+            Oldest item, None if pool is empty
+        '''
+
+        try:
+            names = sorted(f for f in os.listdir(self.path) if f.endswith('.json'))
+        except FileNotFoundError:
+            return None
+        for name in names:
+            filename = os.path.join(self.path, name)
+            # Item is claimed by rename, so concurrent pop does not take it too.
+            try:
+                os.rename(filename, filename + '.pop')
+            except FileNotFoundError:
+                continue
+            images = []
+            try:
+                with open(filename + '.pop', encoding='utf-8') as f:
+                    fields = json.load(f)
+                item = []
+                for value in fields:
+                    if isinstance(value, dict) and 'image' in value:
+                        images.append(os.path.join(self.path, value['image']))
+                        image = Image.open(images[-1])
+                        image.load()
+                        value = image
+                    item.append(value)
+            except (OSError, ValueError) as e:
+                logger.warning('Broken item {} of pool skipped: {}'.format(name, e))
+                item = None
+            for f in images + [filename + '.pop']:
+                try:
+                    os.remove(f)
+                except FileNotFoundError:
+                    pass
+            if item is not None:
+                return tuple(item)
+        return None
+
+    def clean(self, age = ORPHAN_AGE):
+        '''
+            Remove claimed and unfinished items older than age seconds,
+            number of files removed
+        '''
+
+        try:
+            names = os.listdir(self.path)
+        except FileNotFoundError:
+            return 0
+        ready = {f[:-len('.json')] for f in names if f.endswith('.json')}
+        removed = 0
+        for name in names:
+            # Files of item are its JSON with suffixes of claim or write, and images.
+            item_id = name.split('.')[0]
+            if name.endswith('.png'):
+                item_id = item_id.rsplit('_', 1)[0]
+            if item_id in ready:
+                continue
+            filename = os.path.join(self.path, name)
+            try:
+                if time.time() - os.path.getmtime(filename) > age:
+                    os.remove(filename)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        if removed:
+            logger.warning('{} files of unfinished items removed from pool'.format(removed))
+        return removed
+
+def take(backpage, path = POOL_PATH):
+    '''
+        Item of backpage from its pool, SystemError if pool is empty
+    '''
+
+    with metrics.span('backpage_pool') as s:
+        item = Pool(backpage.name, path).pop()
+        if item is None:
+            s.outcome = 'empty'
+    if item is None:
+        # Refresh does not wait for network, back page is skipped instead.
+        raise SystemError('Pool of {} is empty'.format(backpage.name))
+    logger.info('Item for back page taken from pool')
+    return item
+
+def fill(backpage, size = SIZE, stop = None, idle = None, path = POOL_PATH):
+    '''
+        Fetch items of backpage until its pool has size of them. Fetching
+        quits once stop event is set and waits while idle event is not
+    '''
+
+    pool = Pool(backpage.name, path)
+    pool.clean()
+    attempts = (size - len(pool)) * ATTEMPTS
+    added = 0
+    while len(pool) < size and attempts > 0:
+        if idle is not None:
+            while not idle.wait(1):
+                if stop is not None and stop.is_set():
+                    return added
+        if stop is not None and stop.is_set():
+            break
+        attempts -= 1
+        try:
+            item = backpage.fetch()
+        except Exception as e:
+            logger.warning('Fetching {} failed: {}'.format(backpage.name, e))
+            continue
+        if item is not None:
+            pool.put(item)
+            added += 1
+    logger.info('{} items added to pool of {}, {} ready'.format(added, backpage.name, len(pool)))
+    return added
+
+def main():
+    import registry
+
+    parser = argparse.ArgumentParser(prog='python -m backpage.pool', description='Fill pools of backpage items')
+    parser.add_argument('-B', '--backpages', dest='backpages', help='comma separated backpages to fill pools of', default='xkcd,bashorg')
+    parser.add_argument('-n', '--size', dest='size', help='items to keep in every pool', type=int, default=SIZE)
+    parser.add_argument('-l', '--log-level', dest='log_level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], default='ERROR')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=getattr(logging, args.log_level), format='%(levelname)s - %(name)s - %(message)s')
+
+    for name in args.backpages.split(','):
+        backpage = registry.backpage(name)()
+        if hasattr(backpage, 'fetch'):
+            fill(backpage, args.size)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import logging
+import time
+from datetime import timedelta
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+logger = logging.getLogger(__name__)
+
+# Per worker process sheets, fonts and assets are shared by all its renders.
+_sheets = {}
+
+def _init_worker(log_level):
+    logging.basicConfig(level=log_level, format='%(levelname)s - %(name)s - %(message)s')
+    import assets
+    assets.preload()
+
+def _render(template, location, day, image_path):
+    from sheet_base import load_sheet
+    from data import TearOffCalendarData
+    import metrics
+
+    sheet = _sheets.get(template)
+    if sheet is None:
+        sheet = _sheets[template] = load_sheet(template, image_path)
+        sheet.debug_png = True
+    os.makedirs(image_path, exist_ok=True)
+    sheet.image_path = image_path
+
+    # Spans are not written by batch, keep worker memory flat.
+    metrics.reset()
+    start = time.perf_counter()
+    cal_data = TearOffCalendarData().get_data(day, live=False, location=location)
+    sheet.draw(cal_data)
+    return time.perf_counter() - start
+
+def days(date_from, date_to):
+    day = date_from
+    while day <= date_to:
+        yield day
+        day += timedelta(days=1)
+
+def render_range(templates, date_from, date_to, image_path, locations = (None,), workers = None):
+    '''
+        Render sheets of every day of range for every template and location,
+        one directory per sheet: <image_path>/<template>/<location>/<date>
+    '''
+
+    jobs = [(template, location, day, os.path.join(image_path, template, location or 'default', day.isoformat()))
+            for template in templates for location in locations for day in days(date_from, date_to)]
+
+    start = time.perf_counter()
+    durations, failed = [], 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(logging.getLogger().level,)) as executor:
+        futures = {executor.submit(_render, *job): job for job in jobs}
+        for future in as_completed(futures):
+            try:
+                durations.append(future.result())
+            except Exception as e:
+                failed += 1
+                logger.error('Rendering {} failed: {}'.format(futures[future][3], e))
+    elapsed = time.perf_counter() - start
+
+    stats = {
+        'sheets': len(durations),
+        'failed': failed,
+        'seconds': elapsed,
+        'sheets_per_second': len(durations) / elapsed if elapsed else 0,
+        'mean_render_seconds': sum(durations) / len(durations) if durations else 0}
+    logger.info('Batch done: {sheets} sheets, {failed} failed in {seconds:.1f}s'.format(**stats))
+    return stats
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import statistics
+import tracemalloc
+
+p = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')
+sys.path.insert(0, p)
+
+import registry
+import forecast
+from replay import synthetic
+
+logger = logging.getLogger('bench')
+
+PROVIDERS = {'owm': 'OWM', 'gm': 'GM', 'yw': 'YW'}
+
+def parse_and_summarize(provider, body, now, stream):
+    if stream:
+        weather_data = provider.parse(io.BytesIO(body), provider.window(now)[1] + forecast.PARSE_AHEAD)
+    else:
+        weather_data = json.loads(body)
+    if not provider.valid(weather_data):
+        raise ValueError('{} response is not valid'.format(type(provider).__name__))
+    return provider.summarize(weather_data, now)
+
+def bench_provider(name, body, now, repeat, stream = False):
+    '''
+        Seconds of every parse and aggregate of response body, records count
+        and peak memory of one run besides body
+    '''
+
+    provider = registry.weather_provider(PROVIDERS[name])()
+    records = sum(1 for r in provider.records(json.loads(body)))
+    timings = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        parse_and_summarize(provider, body, now, stream)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    parse_and_summarize(provider, body, now, stream)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return timings, records, peak
+
+def main():
+    parser = argparse.ArgumentParser(prog='bench/parse.py', description='Parse and aggregate throughput of weather provider responses')
+    parser.add_argument('-p', '--providers', dest='providers', help='comma separated providers', default=','.join(PROVIDERS))
+    parser.add_argument('-H', '--hours', dest='hours', help='comma separated hours of synthetic responses', default='48,240,2400')
+    parser.add_argument('-n', '--repeat', dest='repeat', help='runs of every response', type=int, default=50)
+    parser.add_argument('-l', '--log-level', dest='log_level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], default='ERROR')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=getattr(logging, args.log_level), format='%(levelname)s - %(name)s - %(message)s')
+
+    modes = (False, True) if forecast.ijson is not None else (False,)
+    if forecast.ijson is None:
+        logger.warning('ijson is not installed, streaming parse is not measured')
+
+    now = int(time.time()) // 3600 * 3600
+    print('{:<4} {:>6} {:>9} {:>8} {:<7} {:>9} {:>9} {:>12} {:>8} {:>9}'.format(
+        '', 'hours', 'body KiB', 'records', 'parse', 'p50 ms', 'p90 ms', 'records/s', 'MiB/s', 'peak KiB'))
+    for name in args.providers.split(','):
+        for hours in (int(h) for h in args.hours.split(',')):
+            body = json.dumps(synthetic(name, hours, now)).encode('utf-8')
+            for stream in modes:
+                timings, records, peak = bench_provider(name, body, now, args.repeat, stream)
+                p50 = statistics.median(timings)
+                p90 = statistics.quantiles(timings, n=10)[-1] if len(timings) > 1 else p50
+                print('{:<4} {:>6} {:>9.1f} {:>8} {:<7} {:>9.2f} {:>9.2f} {:>12.0f} {:>8.1f} {:>9.1f}'.format(
+                    name, hours, len(body) / 1024, records, 'stream' if stream else 'full',
+                    p50 * 1000, p90 * 1000, records / p50, len(body) / p50 / 2**20, peak / 1024))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
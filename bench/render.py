@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import glob
+import time
+import argparse
+import logging
+import tempfile
+import statistics
+import tracemalloc
+from collections import defaultdict
+from functools import wraps
+
+p = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')
+sys.path.insert(0, p)
+
+import fonts
+import assets
+import textfit
+import sheet_base
+from sheet_base import load_sheet, load_cal_data
+
+logger = logging.getLogger('bench')
+
+def percentiles(values):
+    if len(values) < 2:
+        return (values[0],) * 3 if values else (0, 0, 0)
+    q = statistics.quantiles(values, n=100, method='inclusive')
+    return (q[49], q[89], q[98])
+
+def clear_caches():
+    sheet_base._backgrounds.clear()
+    textfit.cache_clear()
+    fonts.cache_clear()
+    assets.cache_clear()
+
+def instrument(sheet, timings):
+    '''
+        Time every draw_* method and save() of the sheet
+    '''
+
+    def timed(name, method):
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                timings[name].append(time.perf_counter() - start)
+        return wrapper
+
+    for name in dir(sheet):
+        if name.startswith('draw_') or name == 'save':
+            setattr(sheet, name, timed(name, getattr(sheet, name)))
+    if sheet.plan is not None:
+        sheet.plan = sheet.compile_layout(sheet.spec)
+
+def bench_template(template, fixtures, repeat, cold, image_path):
+    sheet = load_sheet(template, image_path)
+    sheet.backpage_name = 'xkcd.ru'
+    timings = defaultdict(list)
+    instrument(sheet, timings)
+
+    tracemalloc.start()
+    for i in range(repeat):
+        for fixture in fixtures:
+            if cold:
+                clear_caches()
+            start = time.perf_counter()
+            sheet.draw(fixture)
+            timings['total'].append(time.perf_counter() - start)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return timings, peak
+
+def main():
+    layouts = sorted(os.path.splitext(os.path.basename(f))[0] for f in glob.glob(os.path.join(p, 'layouts', '*.json')))
+
+    parser = argparse.ArgumentParser(prog='bench/render.py', description='Sheet render benchmark')
+    parser.add_argument('-t', '--template', dest='templates', help='comma separated templates', default=','.join(layouts))
+    parser.add_argument('-f', '--fixtures', dest='fixtures', help='directory of cal_data JSON fixtures', default=os.path.join(p, 'bench', 'fixtures'))
+    parser.add_argument('-n', '--repeat', dest='repeat', help='renders of every fixture', type=int, default=20)
+    parser.add_argument('-c', '--cold', dest='cold', help='clear font, fit, asset and background caches before every render', action='store_true')
+    parser.add_argument('-l', '--log-level', dest='log_level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], default='ERROR')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=getattr(logging, args.log_level), format='%(levelname)s - %(name)s - %(message)s')
+
+    fixtures = [load_cal_data(f) for f in sorted(glob.glob(os.path.join(args.fixtures, '*.json')))]
+    if not fixtures:
+        logger.error('No fixtures found in ' + args.fixtures)
+        return 1
+
+    failed = 0
+    with tempfile.TemporaryDirectory() as image_path:
+        for template in args.templates.split(','):
+            try:
+                timings, peak = bench_template(template, fixtures, args.repeat, args.cold, image_path)
+            except Exception as e:
+                logger.error('Template {} failed: {}'.format(template, e))
+                failed += 1
+                continue
+            print('{} ({} renders, peak memory {:.1f} MiB)'.format(template, len(timings['total']), peak / 2**20))
+            print('    {:<24} {:>9} {:>9} {:>9}'.format('stage', 'p50 ms', 'p90 ms', 'p99 ms'))
+            for name in sorted(timings, key=lambda n: (n == 'total', n)):
+                print('    {:<24} {:>9.2f} {:>9.2f} {:>9.2f}'.format(name, *(v * 1000 for v in percentiles(timings[name]))))
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
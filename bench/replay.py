@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import gzip
+import json
+import time
+import random
+import hashlib
+import argparse
+import logging
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+logger = logging.getLogger('replay')
+
+# Provider of API path, recorded response of it is read from <provider>.json.
+PATHS = {
+    '/data/2.5/onecall': 'owm',
+    '/v2/weather/forecast/': 'gm',
+    '/v2/forecast': 'yw'}
+
+OWM_WEATHER = ((800, 'Clear', 'ясно', '01'), (801, 'Clouds', 'небольшая облачность', '02'),
+               (803, 'Clouds', 'облачно с прояснениями', '04'), (500, 'Rain', 'небольшой дождь', '10'),
+               (600, 'Snow', 'небольшой снег', '13'), (701, 'Mist', 'туман', '50'))
+GM_WEATHER = ((0, 'Ясно', '{}'), (1, 'Малооблачно', '{}_c1'), (2, 'Облачно', '{}_c2'),
+              (3, 'Пасмурно, небольшой дождь', 'c3_r1'), (3, 'Пасмурно, снег', 'c3_s2'))
+YW_WEATHER = (('clear', 'skc_{}'), ('partly-cloudy', 'bkn_{}'), ('overcast', 'ovc'),
+              ('light-rain', 'ovc_-ra'), ('snow', 'ovc_sn'))
+
+def temperature(rnd, ts, mean):
+    '''
+        Daily swing of temperature around mean with some noise
+    '''
+
+    hour = time.localtime(ts).tm_hour
+    return mean + 5 * -((hour - 3) % 24 - 12) / 12 + rnd.gauss(0, 0.7)
+
+def day_or_night(ts):
+    return 'd' if 6 <= time.localtime(ts).tm_hour < 21 else 'n'
+
+def synthetic_owm(rnd, start, hours):
+    hourly = []
+    for i in range(hours):
+        ts = start + i * 3600
+        code, cast, description, icon = rnd.choice(OWM_WEATHER)
+        temp = temperature(rnd, ts, 12)
+        hourly.append({
+            'dt': ts,
+            'temp': round(temp, 2),
+            'feels_like': round(temp - rnd.random() * 3, 2),
+            'pressure': rnd.randint(995, 1030),
+            'humidity': rnd.randint(30, 100),
+            'dew_point': round(temp - rnd.random() * 8, 2),
+            'uvi': round(rnd.random() * 5, 2),
+            'clouds': rnd.randint(0, 100),
+            'visibility': 10000,
+            'wind_speed': round(rnd.random() * 9, 2),
+            'wind_deg': rnd.randint(0, 359),
+            'wind_gust': round(rnd.random() * 15, 2),
+            'weather': [{'id': code, 'main': cast, 'description': description, 'icon': icon + day_or_night(ts)}],
+            'pop': round(rnd.random(), 2)})
+    offset = time.localtime(start).tm_gmtoff
+    return {'lat': 55.7559, 'lon': 37.6177, 'timezone': 'Europe/Moscow', 'timezone_offset': offset, 'hourly': hourly}
+
+def synthetic_gm(rnd, start, hours):
+    response = []
+    # Forecast of 3 hour steps.
+    for i in range(0, hours, 3):
+        ts = start + i * 3600
+        cloudiness, description, icon = rnd.choice(GM_WEATHER)
+        temp = round(temperature(rnd, ts, 12), 1)
+        speed = rnd.randint(0, 9)
+        response.append({
+            'kind': 'Frc',
+            'date': {
+                'UTC': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(ts)),
+                'local': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts)),
+                'time_zone_offset': time.localtime(ts).tm_gmtoff // 60,
+                'unix': ts},
+            'temperature': {'air': {'C': temp, 'F': round(temp * 1.8 + 32, 1)}, 'comfort': {'C': temp - 2, 'F': round((temp - 2) * 1.8 + 32, 1)}},
+            'humidity': {'percent': rnd.randint(30, 100)},
+            'pressure': {'mm_hg_atm': rnd.randint(735, 770), 'h_pa': rnd.randint(980, 1025), 'in_hg': 29.9},
+            'wind': {'speed': {'m_s': speed, 'km_h': round(speed * 3.6), 'mi_h': round(speed * 2.24)},
+                     'direction': {'degree': rnd.randint(0, 359), 'scale_8': rnd.randint(0, 8)}},
+            'cloudiness': {'type': cloudiness, 'percent': cloudiness * 33},
+            'precipitation': {'type': 0, 'amount': 0, 'intensity': 0},
+            'description': {'full': description},
+            'icon': icon.format(day_or_night(ts)),
+            'gm': rnd.randint(0, 3)})
+    return {'meta': {'status': True, 'message': ''}, 'response': response}
+
+def synthetic_yw(rnd, start, hours):
+    forecasts = []
+    # Forecast of whole local days.
+    day = start - time.localtime(start).tm_hour * 3600
+    while day < start + hours * 3600:
+        hour_items = []
+        for hour in range(24):
+            ts = day + hour * 3600
+            condition, icon = rnd.choice(YW_WEATHER)
+            temp = round(temperature(rnd, ts, 12))
+            hour_items.append({
+                'hour': str(hour),
+                'hour_ts': ts,
+                'temp': temp,
+                'feels_like': temp - rnd.randint(0, 3),
+                'icon': icon.format(day_or_night(ts)),
+                'condition': condition,
+                'cloudness': rnd.choice((0, 0.25, 0.5, 0.75, 1)),
+                'prec_type': 0,
+                'prec_strength': 0,
+                'is_thunder': False,
+                'wind_dir': rnd.choice(('n', 'ne', 'e', 'se', 's', 'sw', 'w', 'nw')),
+                'wind_speed': round(rnd.random() * 9, 1),
+                'wind_gust': round(rnd.random() * 15, 1),
+                'wind_angle': rnd.randint(0, 359),
+                'pressure_mm': rnd.randint(735, 770),
+                'pressure_pa': rnd.randint(980, 1025),
+                'humidity': rnd.randint(30, 100),
+                'uv_index': rnd.randint(0, 5),
+                'soil_temp': temp - 3,
+                'soil_moisture': round(rnd.random() * 0.4, 2),
+                'prec_mm': 0,
+                'prec_period': 60,
+                'prec_prob': rnd.randint(0, 100)})
+        # Day parts summary precede hours in response.
+        parts = {}
+        for name, first in (('night', 0), ('morning', 6), ('day', 12), ('evening', 18), ('day_short', 6), ('night_short', 0)):
+            hours_of_part = hour_items[first:first + 6]
+            part = {key: value for key, value in hours_of_part[len(hours_of_part) // 2].items() if key not in ('hour', 'hour_ts')}
+            part.update({'_source': ','.join(str(first + i) for i in range(6)), 'daytime': 'n' if first < 6 else 'd', 'polar': False,
+                         'temp_min': min(h['temp'] for h in hours_of_part), 'temp_avg': round(sum(h['temp'] for h in hours_of_part) / 6),
+                         'temp_max': max(h['temp'] for h in hours_of_part)})
+            parts[name] = part
+        forecasts.append({'date': time.strftime('%Y-%m-%d', time.localtime(day)), 'date_ts': day,
+                          'week': int(time.strftime('%W', time.localtime(day))), 'sunrise': '05:12', 'sunset': '20:48',
+                          'moon_code': rnd.randint(0, 15), 'moon_text': 'moon-code-{}'.format(rnd.randint(0, 15)),
+                          'parts': parts, 'hours': hour_items})
+        day += 24 * 3600
+    fact = {key: value for key, value in forecasts[0]['hours'][time.localtime(start).tm_hour].items() if key not in ('hour', 'hour_ts')}
+    fact.update({'obs_time': int(start), 'season': 'autumn', 'source': 'station'})
+    return {'now': int(start), 'now_dt': time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime(start)),
+            'info': {'lat': 55.7559, 'lon': 37.6177, 'tzinfo': {'name': 'Europe/Moscow', 'offset': time.localtime(start).tm_gmtoff}},
+            'fact': fact, 'forecasts': forecasts}
+
+SYNTHETIC = {'owm': synthetic_owm, 'gm': synthetic_gm, 'yw': synthetic_yw}
+
+def synthetic(provider, hours = 48, start = None, seed = 0):
+    '''
+        Response of provider with hourly forecast of hours from start,
+        the current hour by default
+    '''
+
+    start = int(time.time()) // 3600 * 3600 if start is None else start
+    return SYNTHETIC[provider](random.Random(seed), start, hours)
+
+def shift(provider, data, start = None):
+    '''
+        Recorded response moved in time to start from start hour, the current one by default
+    '''
+
+    start = int(time.time()) // 3600 * 3600 if start is None else start
+    if provider == 'owm':
+        items, key = data['hourly'], ('dt',)
+    elif provider == 'gm':
+        items, key = data['response'], ('date', 'unix')
+    else:
+        items, key = [hour for day in data['forecasts'] for hour in day['hours']], ('hour_ts',)
+    if not items:
+        return data
+
+    def get(item):
+        for k in key[:-1]:
+            item = item[k]
+        return item
+
+    # Whole days keep local hours of records.
+    delta = (start - min(get(item)[key[-1]] for item in items)) // 86400 * 86400
+    for item in items:
+        get(item)[key[-1]] += delta
+    if provider == 'yw':
+        for day in data['forecasts']:
+            day['date_ts'] = day.get('date_ts', 0) + delta
+    return data
+
+class Replay(ThreadingHTTPServer):
+    '''
+        Serves provider responses with injected latency, errors and malformed bodies
+    '''
+
+    daemon_threads = True
+
+    def __init__(self, address, bodies, latency = 0, jitter = 0, error_rate = 0, malformed_rate = 0, empty_rate = 0, seed = None):
+        super().__init__(address, Handler)
+        self.bodies = {provider: json.dumps(data, ensure_ascii=False).encode('utf-8') for provider, data in bodies.items()}
+        self.empty = {provider: json.dumps({'owm': {'hourly': []}, 'gm': {'response': []}, 'yw': {'forecasts': []}}[provider]).encode('utf-8') for provider in bodies}
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.empty_rate = empty_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+
+    def handle_error(self, request, client_address):
+        # Streaming clients hang up once they have read enough.
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            logger.debug('{} closed connection'.format(client_address[0]))
+        else:
+            super().handle_error(request, client_address)
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logger.debug('%s ' + format, self.address_string(), *args)
+
+    def reply(self, status, body = b'', headers = {}):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        server.requests += 1
+        provider = PATHS.get(self.path.split('?')[0])
+        if provider is None or provider not in server.bodies:
+            self.reply(404)
+            return
+
+        delay = server.latency + server.random.uniform(0, server.jitter)
+        if delay:
+            time.sleep(delay)
+
+        roll = server.random.random()
+        if roll < server.error_rate:
+            self.reply(server.random.choice((500, 502, 503, 504)))
+            return
+        roll -= server.error_rate
+        if roll < server.malformed_rate:
+            body = server.bodies[provider]
+            self.reply(200, body[:server.random.randrange(1, len(body))], {'Content-Type': 'application/json'})
+            return
+        roll -= server.malformed_rate
+        body = server.empty[provider] if roll < server.empty_rate else server.bodies[provider]
+
+        etag = '"{}"'.format(hashlib.md5(body).hexdigest())
+        if self.headers.get('If-None-Match') == etag:
+            self.reply(304, headers={'ETag': etag})
+            return
+        headers = {'Content-Type': 'application/json', 'ETag': etag}
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body, 5)
+            headers['Content-Encoding'] = 'gzip'
+        self.reply(200, body, headers)
+
+def main():
+    parser = argparse.ArgumentParser(prog='bench/replay.py', description='Local replay server of weather provider APIs',
+                                     epilog='Point providers to it with WeatherURL=http://HOST:PORT in config.ini')
+    parser.add_argument('-a', '--address', dest='address', help='address to listen on', default='127.0.0.1')
+    parser.add_argument('-p', '--port', dest='port', help='port to listen on', type=int, default=8080)
+    parser.add_argument('-r', '--recorded', dest='recorded', help='directory of recorded owm.json, gm.json and yw.json responses, synthetic ones are served for missing')
+    parser.add_argument('-H', '--hours', dest='hours', help='hours of synthetic forecast', type=int, default=48)
+    parser.add_argument('--latency', dest='latency', help='delay of every response, ms', type=float, default=0)
+    parser.add_argument('--jitter', dest='jitter', help='random extra delay up to, ms', type=float, default=0)
+    parser.add_argument('--errors', dest='error_rate', help='share of 5xx responses', type=float, default=0)
+    parser.add_argument('--malformed', dest='malformed_rate', help='share of truncated JSON bodies', type=float, default=0)
+    parser.add_argument('--empty', dest='empty_rate', help='share of valid responses without forecast', type=float, default=0)
+    parser.add_argument('--seed', dest='seed', help='seed of synthetic data and injected faults', type=int)
+    parser.add_argument('-l', '--log-level', dest='log_level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], default='INFO')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=getattr(logging, args.log_level), format='%(levelname)s - %(name)s - %(message)s')
+
+    bodies = {}
+    for provider in SYNTHETIC:
+        filename = os.path.join(args.recorded, provider + '.json') if args.recorded else None
+        if filename and os.path.isfile(filename):
+            with open(filename, 'rb') as f:
+                bodies[provider] = shift(provider, json.load(f))
+            logger.info('{} replays {}'.format(provider, filename))
+        else:
+            bodies[provider] = synthetic(provider, args.hours, seed=args.seed or 0)
+            logger.info('{} serves {} synthetic hours'.format(provider, args.hours))
+
+    server = Replay((args.address, args.port), bodies, args.latency / 1000, args.jitter / 1000,
+                    args.error_rate, args.malformed_rate, args.empty_rate, args.seed)
+    logger.info('Listening on http://{}:{}'.format(*server.server_address))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
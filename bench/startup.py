@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import argparse
+import subprocess
+
+p = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')
+
+# Modules a sheet run needs before any data is collected.
+STARTUP = '''
+import sys
+sys.argv = ['cal.py']
+import argparse, logging, metrics, registry
+from sheet_base import load_sheet
+import data
+load_sheet({template!r})
+'''
+
+# Plugins resolved by name must not be imported at start.
+LAZY = ('requests', 'net', 'ensemble', 'lxml', 'ephem', 'owm', 'gm', 'yw', 'backpage.xkcd', 'backpage.bashorg')
+
+def measure(template):
+    '''
+        Import times (module, self us, cumulative us) of cold start reported by -X importtime
+    '''
+
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', STARTUP.format(template=template)],
+                          cwd=p, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().split('\n')[-1])
+    imports = []
+    for line in proc.stderr.split('\n'):
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        imports.append((name.rstrip(), int(self_us), int(cumulative_us)))
+    return imports
+
+def main():
+    parser = argparse.ArgumentParser(prog='bench/startup.py', description='Cold start import time benchmark')
+    parser.add_argument('-t', '--template', dest='template', help='reference template', default='1')
+    parser.add_argument('-b', '--budget', dest='budget', help='import time budget, ms', type=float, default=250)
+    parser.add_argument('-n', '--repeat', dest='repeat', help='runs, best one is reported', type=int, default=5)
+    parser.add_argument('--top', dest='top', help='slowest top level imports to show', type=int, default=10)
+    args = parser.parse_args()
+
+    runs = [measure(args.template) for i in range(args.repeat)]
+    # Nested imports are indented, top level ones sum up to total.
+    totals = [sum(c for name, s, c in imports if not name.startswith('  ')) for imports in runs]
+    best = runs[totals.index(min(totals))]
+    total_ms = min(totals) / 1000
+
+    print('Template {}: imports take {:.1f} ms (budget {:.1f} ms), {} modules'.format(args.template, total_ms, args.budget, len(best)))
+    top = sorted((i for i in best if not i[0].startswith('  ')), key=lambda i: i[2], reverse=True)[:args.top]
+    for name, self_us, cumulative_us in top:
+        print('    {:<32} {:>9.1f} ms'.format(name.strip(), cumulative_us / 1000))
+
+    failed = False
+    eager = sorted(set(name.strip() for name, s, c in best) & set(LAZY))
+    if eager:
+        print('FAIL: imported at start: {}'.format(', '.join(eager)))
+        failed = True
+    if total_ms > args.budget:
+        print('FAIL: over budget by {:.1f} ms'.format(total_ms - args.budget))
+        failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
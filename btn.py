@@ -6,7 +6,7 @@ import signal
 import argparse
 import logging
 import RPi.GPIO as GPIO
-from sheet_base import TearOffCalendarBaseSheet
+from sheet_base import TearOffCalendarBaseSheet, load_sheet
 from time import sleep
 
 def quit(signalNumber = None, frame = None):
@@ -24,6 +24,7 @@ def main():
         parser = argparse.ArgumentParser(prog='pytoc', description='Python Tear-Off Calendar', usage='%(prog)s [options]')
 
         parser.add_argument('-p', '--pin', dest='buttonPin', help='GPIO pin number', type=int)
+        parser.add_argument('-t', '--template', dest='template', help='name of calendar sheet template')
         parser.add_argument('-i', '--image', dest='image', help='path for images', default='.')
         parser.add_argument('-l', '--log-level', dest='log_level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], default='ERROR')
 
@@ -43,7 +44,10 @@ def main():
         GPIO.setup(buttonPin, GPIO.IN,pull_up_down=GPIO.PUD_UP)
         logger.debug('GPIO setup done')
 
-        sheet = TearOffCalendarBaseSheet(args.image)
+        if args.template:
+            sheet = load_sheet(args.template, args.image)
+        else:
+            sheet = TearOffCalendarBaseSheet(args.image)
 
         lock = False
         back = False
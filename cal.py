@@ -3,9 +3,11 @@
 
 import argparse
 import logging
-import random
-from backpage.dummy import Dummy
-from backpage.xkcd import XKCD
+import sys
+from datetime import date, datetime, timedelta
+from sheet_base import load_sheet, PRERENDER_HOUR
+import metrics
+import registry
 
 parser = argparse.ArgumentParser(prog='pytoc', description='Python Tear-Off Calendar', usage='%(prog)s [options]')
 
@@ -13,6 +15,15 @@ parser.add_argument('-t', '--template', dest='template', help='name of calendar
 parser.add_argument('-i', '--image', dest='image', help='path for images', default='.')
 parser.add_argument('-b', '--back', dest='back', help='display back image on screen', action='store_true')
 parser.add_argument('-f', '--front', dest='front', help='display front image on screen', action='store_true')
+parser.add_argument('-c', '--cache-background', dest='cache_background', help='keep static background layers in image path', action='store_true')
+parser.add_argument('-P', '--prerender', dest='prerender', help='show sheet prerendered ahead and from {}:00 prerender the next one'.format(PRERENDER_HOUR), action='store_true')
+parser.add_argument('-p', '--png', dest='png', help='also save rendered planes as PNG images', action='store_true')
+parser.add_argument('--from', dest='date_from', help='batch: render sheets from this date (YYYY-MM-DD)', type=date.fromisoformat)
+parser.add_argument('--to', dest='date_to', help='batch: render sheets up to this date (YYYY-MM-DD)', type=date.fromisoformat)
+parser.add_argument('--location', dest='location', help='batch: comma separated config locations')
+parser.add_argument('-B', '--backpages', dest='backpages', help='comma separated backpages to choose from: ' + ', '.join(registry.BACKPAGES))
+parser.add_argument('-m', '--metrics', dest='metrics', help='path for run metrics, image path by default')
+parser.add_argument('--workers', dest='workers', help='batch: number of worker processes', type=int)
 parser.add_argument('-l', '--log-level', dest='log_level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], default='ERROR')
 
 parser._optionals.title = 'Options'
@@ -22,23 +33,45 @@ args = parser.parse_args()
 logging.basicConfig(level=getattr(logging, args.log_level), format='%(levelname)s - %(name)s - %(message)s')
 logger = logging.getLogger("cal")
 
-sheet = __import__('sheet_' + args.template, globals(), locals(), ['TearOffCalendarSheet']).TearOffCalendarSheet(args.image)
-if not args.back:
-    if not args.front:
-        if "7in5" in args.template:
-            backpages = [Dummy]
+if args.date_from or args.date_to:
+    import batch
+    stats = batch.render_range(args.template.split(','), args.date_from or date.today(), args.date_to or args.date_from,
+        args.image, args.location.split(',') if args.location else (None,), args.workers)
+    print('{sheets} sheets rendered, {failed} failed in {seconds:.1f}s: {sheets_per_second:.2f} sheets/s, {mean_render_seconds:.3f}s per sheet'.format(**stats))
+    sys.exit(1 if stats['failed'] else 0)
+
+sheet = load_sheet(args.template, args.image)
+sheet.background_on_disk = args.cache_background
+sheet.debug_png = args.png
+run = 'back' if args.back else 'front' if args.front else 'cal'
+outcome = 'error'
+try:
+    if not args.back:
+        if not args.front:
+            backpages = args.backpages.split(',') if args.backpages else registry.default_backpages(args.template)
+            cal_data = None
+            if args.prerender:
+                from data import TearOffCalendarData
+                cal_data = TearOffCalendarData().get_data()
+            if cal_data is None or not sheet.draw_prerendered(cal_data):
+                backsheet = registry.choose_backpage(backpages, sheet.page_w, sheet.page_h, args.image)
+
+                sheet.backpage_name = backsheet.name
+                sheet.draw(cal_data)
+                try:
+                    backsheet.draw()
+                except SystemError as e:
+                    logger.error(e)
+            sheet.display_front()
+            if args.prerender and datetime.now().hour >= PRERENDER_HOUR:
+                try:
+                    sheet.prerender(date.today() + timedelta(days=1), backpages)
+                except Exception as e:
+                    logger.error('Prerender failed: {}'.format(e))
         else:
-            backpages = [XKCD, Dummy]
-        backsheet = random.choice(backpages)(w = sheet.page_w, h = sheet.page_h, image_path = args.image)
-
-        sheet.backpage_name = backsheet.name
-        sheet.draw()
-        try:
-            backsheet.draw()
-        except SystemError as e:
-            logger.error(e)
-        sheet.display_front()
+            sheet.display_front()
     else:
-        sheet.display_front()
-else:
-    sheet.display_back()
\ No newline at end of file
+        sheet.display_back()
+    outcome = 'ok'
+finally:
+    metrics.write(args.metrics or args.image, run, outcome)
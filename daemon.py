@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import signal
+import argparse
+import logging
+import threading
+from datetime import date, datetime, timedelta
+import assets
+import astro
+import metrics
+from sheet_base import load_sheet, PRERENDER_HOUR
+import registry
+from backpage import pool
+
+try:
+    import RPi.GPIO as GPIO
+except ImportError:
+    GPIO = None
+
+logger = logging.getLogger('daemon')
+
+HOURS = (0, 6, 12, 18)
+# Seconds between checks of backpage pools.
+POOL_INTERVAL = 30 * 60
+
+def next_run(now, hours = HOURS):
+    '''
+        First scheduled refresh after now
+    '''
+
+    day = now.replace(minute=0, second=0, microsecond=0)
+    for days in (0, 1):
+        for hour in sorted(hours):
+            t = day.replace(hour=hour) + timedelta(days=days)
+            if t > now:
+                return t
+
+class CalendarDaemon:
+    '''
+        Keeps sheet, fonts, assets and EPD drivers loaded, refreshes sheet
+        by schedule and switches front and back pages by button. Astronomical
+        tables and pools of backpages are filled while there is nothing else
+        to do
+    '''
+
+    def __init__(self, template, image_path = '.', pin = None, metrics_path = None, hours = HOURS, backpages = None, prerender = False, pool_size = pool.SIZE):
+        self.template = template
+        self.image_path = image_path
+        self.pin = pin
+        self.metrics_path = metrics_path or image_path
+        self.hours = hours
+        self.backpages = backpages or registry.default_backpages(template)
+        self.prerender = prerender
+        self.pool_size = pool_size
+        self.back = False
+        self.stop = threading.Event()
+        self.idle = threading.Event()
+
+        assets.preload()
+        self.sheet = load_sheet(template, image_path)
+
+    def refresh(self):
+        cal_data = None
+        if self.prerender:
+            from data import TearOffCalendarData
+            cal_data = TearOffCalendarData().get_data()
+        if cal_data is None or not self.sheet.draw_prerendered(cal_data):
+            backsheet = registry.choose_backpage(self.backpages, self.sheet.page_w, self.sheet.page_h, self.image_path)
+
+            self.sheet.backpage_name = backsheet.name
+            self.sheet.draw(cal_data)
+            try:
+                backsheet.draw()
+            except SystemError as e:
+                logger.error(e)
+        self.sheet.display_front()
+        self.back = False
+
+        if self.prerender and datetime.now().hour >= PRERENDER_HOUR:
+            try:
+                self.sheet.prerender(date.today() + timedelta(days=1), self.backpages)
+            except Exception:
+                logger.exception('Prerender failed')
+
+    def toggle(self):
+        if not self.back:
+            self.sheet.display_back()
+            logger.info('Back drawn')
+            self.back = True
+        else:
+            self.sheet.display_front()
+            logger.info('Front drawn')
+            self.back = False
+
+    def run_job(self, run, job):
+        self.idle.clear()
+        metrics.reset()
+        outcome = 'error'
+        try:
+            job()
+            outcome = 'ok'
+        except Exception:
+            logger.exception('Run {} failed'.format(run))
+        finally:
+            metrics.write(self.metrics_path, run, outcome)
+            self.idle.set()
+
+    def prepare_tables(self):
+        while not self.idle.wait(1):
+            if self.stop.is_set():
+                return
+        try:
+            astro.prepare(*astro.location())
+        except Exception:
+            logger.exception('Building astronomical tables failed')
+
+    def fill_pools(self):
+        while not self.stop.is_set():
+            self.prepare_tables()
+            for name in self.backpages if self.pool_size > 0 else ():
+                backpage = registry.backpage(name)(w = self.sheet.page_w, h = self.sheet.page_h, image_path = self.image_path)
+                if hasattr(backpage, 'fetch'):
+                    try:
+                        pool.fill(backpage, self.pool_size, self.stop, self.idle)
+                    except Exception:
+                        logger.exception('Filling pool of {} failed'.format(name))
+            self.stop.wait(POOL_INTERVAL)
+
+    def run(self):
+        if self.pin is not None:
+            GPIO.setmode(GPIO.BCM)
+            GPIO.setup(self.pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+            logger.debug('GPIO setup done')
+
+        self.run_job('cal', self.refresh)
+        scheduled = next_run(datetime.now(), self.hours)
+        logger.info('Next refresh at {}'.format(scheduled))
+
+        filler = threading.Thread(target=self.fill_pools, name='pool', daemon=True)
+        filler.start()
+
+        lock = False
+        while not self.stop.is_set():
+            if self.pin is not None:
+                buttonState = GPIO.input(self.pin)
+                if buttonState == GPIO.HIGH and not lock:
+                    logger.info('Button pressed and locked')
+                    lock = True
+                    self.run_job('front' if self.back else 'back', self.toggle)
+                elif buttonState == GPIO.LOW and lock:
+                    lock = False
+                    logger.info('Button unlocked')
+
+            now = datetime.now()
+            if now >= scheduled:
+                self.run_job('cal', self.refresh)
+                scheduled = next_run(datetime.now(), self.hours)
+                logger.info('Next refresh at {}'.format(scheduled))
+            elif scheduled - now > timedelta(days=1):
+                # Clock was set back.
+                scheduled = next_run(now, self.hours)
+
+            self.stop.wait(0.1 if self.pin is not None else 1)
+
+        if self.pin is not None:
+            GPIO.cleanup(self.pin)
+        logger.info('Quit')
+
+def main():
+    parser = argparse.ArgumentParser(prog='pytoc', description='Python Tear-Off Calendar daemon', usage='%(prog)s [options]')
+
+    parser.add_argument('-t', '--template', dest='template', help='name of calendar sheet template', required=True)
+    parser.add_argument('-i', '--image', dest='image', help='path for images', default='.')
+    parser.add_argument('-p', '--pin', dest='buttonPin', help='GPIO pin number of button', type=int)
+    parser.add_argument('-c', '--cache-background', dest='cache_background', help='keep static background layers in image path', action='store_true')
+    parser.add_argument('-P', '--prerender', dest='prerender', help='show sheet prerendered ahead and from {}:00 prerender the next one'.format(PRERENDER_HOUR), action='store_true')
+    parser.add_argument('-B', '--backpages', dest='backpages', help='comma separated backpages to choose from: ' + ', '.join(registry.BACKPAGES))
+    parser.add_argument('--pool', dest='pool_size', help='backpage items to fetch ahead while idle, 0 disables', type=int, default=pool.SIZE)
+    parser.add_argument('-m', '--metrics', dest='metrics', help='path for run metrics, image path by default')
+    parser.add_argument('--hours', dest='hours', help='comma separated hours of refresh', default=','.join(str(h) for h in HOURS))
+    parser.add_argument('-l', '--log-level', dest='log_level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], default='ERROR')
+
+    parser._optionals.title = 'Options'
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level=getattr(logging, args.log_level), format='%(levelname)s - %(name)s - %(message)s')
+
+    if args.buttonPin is not None and GPIO is None:
+        logger.error('RPi.GPIO is not available, button disabled')
+        args.buttonPin = None
+
+    daemon = CalendarDaemon(args.template, args.image, args.buttonPin, args.metrics, tuple(int(h) for h in args.hours.split(',')),
+        args.backpages.split(',') if args.backpages else None, args.prerender, args.pool_size)
+    daemon.sheet.background_on_disk = args.cache_background
+
+    def quit(signalNumber, frame):
+        daemon.stop.set()
+    signal.signal(signal.SIGTERM, quit)
+    signal.signal(signal.SIGINT, quit)
+
+    logger.info('Started')
+    daemon.run()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,12 +4,15 @@
 import os
 import logging
 import configparser
-from datetime import datetime
+from datetime import datetime, time
 import locale
-import ephem
-from owm import OWM
-from gm import GM
+from time import monotonic
+from concurrent.futures import ThreadPoolExecutor, wait
 import wifi
+import astro
+import registry
+import metrics
+import store
 import json
 
 logger = logging.getLogger(__name__)
@@ -19,37 +22,63 @@ def map_to_range(value, inMin, inMax, outMin, outMax):
 
 class TearOffCalendarData:
 
+    # Seconds to wait for live sources, whatever is late is left out of the sheet.
+    DEADLINE = 20
+
+    @staticmethod
+    def __get_forecast(weather_service, coord, merge = False, base_url = None):
+        with metrics.span('weather') as s:
+            weather = registry.forecast_source(weather_service, merge, base_url)
+            forecast = weather.get_forecast(coord)
+            if not forecast:
+                s.outcome = 'fallback'
+        return forecast
+
     @staticmethod
-    def __get_moon_phase(observer):
-        target_date_utc = observer.date
-        target_date_local = ephem.localtime( target_date_utc ).date()
-        next_full = ephem.localtime( ephem.next_full_moon(target_date_utc) ).date()
-        next_new = ephem.localtime( ephem.next_new_moon(target_date_utc) ).date()
-        next_last_quarter = ephem.localtime( ephem.next_last_quarter_moon(target_date_utc) ).date()
-        next_first_quarter = ephem.localtime( ephem.next_first_quarter_moon(target_date_utc) ).date()
-        previous_full = ephem.localtime( ephem.previous_full_moon(target_date_utc) ).date()
-        previous_new = ephem.localtime( ephem.previous_new_moon(target_date_utc) ).date()
-        previous_last_quarter = ephem.localtime( ephem.previous_last_quarter_moon(target_date_utc) ).date()
-        previous_first_quarter = ephem.localtime( ephem.previous_first_quarter_moon(target_date_utc) ).date()
-
-        if target_date_local in (next_full, previous_full):
-            return 4
-        elif target_date_local in (next_new, previous_new):
-            return 0
-        elif target_date_local in (next_first_quarter, previous_first_quarter):
-            return 2
-        elif target_date_local in (next_last_quarter, previous_last_quarter):
-            return 6
-        elif previous_new < next_first_quarter < next_full < next_last_quarter < next_new:
-            return 1
-        elif previous_first_quarter < next_full < next_last_quarter < next_new < next_first_quarter:
-            return 3
-        elif previous_full < next_last_quarter < next_new < next_first_quarter < next_full:
-            return 5
-        elif previous_last_quarter < next_new < next_first_quarter < next_full < next_last_quarter:
-            return 7
-
-    def get_data(self):
+    def __get_wifi_qlt():
+        with metrics.span('wifi') as s:
+            wifi_qlt = wifi.get_quality('wlan0')
+            if wifi_qlt is None:
+                s.outcome = 'fallback'
+            else:
+                store.add_samples({'wifi': wifi_qlt})
+        return round(map_to_range(wifi_qlt, 0, 100, 0, 4)) if wifi_qlt else None
+
+    @staticmethod
+    def __get_battery():
+        battery = {'level': 'unknown', 'charging': 0}
+        with metrics.span('battery') as s:
+            try:
+                import ina219
+                ups = ina219.INA219(addr=0x43)
+                percent = ups.getPercent()
+                battery['level'] = round(percent)//10*10
+                battery['charging'] = ups.getCharging()
+                store.add_samples({'battery': percent, 'voltage': ups.getBusVoltage_V(), 'current': ups.getCurrent_mA()})
+                if battery['level'] < 20:
+                    battery['level'] = 20
+                elif battery['level'] == 40:
+                    battery['level'] = 30
+                elif battery['level'] == 70:
+                    battery['level'] = 60
+                elif battery['level'] >= 90 and battery['charging'] == 1:
+                    battery['level'] = 100
+            except ImportError:
+                s.outcome = 'fallback'
+                battery['level'] = 'unknown'
+                battery['charging'] = 0
+        return battery
+
+    def get_data(self, when = None, live = True, location = None, deadline = None):
+        '''
+            Collect data for sheet of day when (today by default).
+            Without live the weather, wifi and battery are not queried,
+            sources missing deadline (DEADLINE seconds by default) fall back.
+        '''
+
+        started = monotonic()
+        deadline = self.DEADLINE if deadline is None else deadline
+
         try:
             locale.setlocale(locale.LC_TIME, 'ru_RU.UTF-8')
         except locale.Error:
@@ -60,11 +89,13 @@ class TearOffCalendarData:
         if os.path.isfile(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'config.ini')):
             config = configparser.ConfigParser()
             config.read(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'config.ini'))
-            cal_data['location'] = config['Common']['CurrentLocation']
+            cal_data['location'] = location or config['Common']['CurrentLocation']
             cal_data['latitude'] = config[cal_data['location']]['Latitude']
             cal_data['longitude'] = config[cal_data['location']]['Longitude']
             cal_data['location_name'] = config[cal_data['location']]['Name']
             weather_service = config['Common']['WeatherService']
+            weather_merge = config['Common'].getboolean('WeatherMerge', False)
+            weather_url = config['Common'].get('WeatherURL')
             wifi_device = config['Common']['WiFiDevice']
         else:
             cal_data['location'] = 'Moscow'
@@ -72,11 +103,16 @@ class TearOffCalendarData:
             cal_data['longitude'] = 37.617698
             cal_data['location_name'] = 'Москва'
             weather_service = None
+            weather_merge = False
+            weather_url = None
             wifi_device = None
 
-        today = datetime.today()
-        btoday = today.replace(hour=0, minute=0, second=0, microsecond=0)
-        etoday = today.replace(hour=23, minute=59, second=59, microsecond=999)
+        if when is None:
+            today = datetime.today()
+        elif isinstance(when, datetime):
+            today = when
+        else:
+            today = datetime.combine(when, time(12))
 
         t = today
         cd = int(t.strftime('%-d')), int(t.strftime('%-m'))
@@ -88,77 +124,48 @@ class TearOffCalendarData:
         cal_data['holiday_dayoff'] = False
         year = t.strftime('%Y')
 
-        try:
-            with open(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'misc', 'holidays_' + year + '.json'), 'rb') as f:
-                data = json.load(f)
-                if 'daysOff' in data and cd[0] in data["daysOff"][cd[1]-1]:
-                    cal_data['dayoff'] = True
-                if 'holidays' in data and data['holidays'][cd[1]-1][cd[0]-1]['title'] != '':
-                    cal_data['holiday'] = True
-                    cal_data['holiday_title'] = data['holidays'][cd[1]-1][cd[0]-1]['title']
-                    cal_data['holiday_dayoff'] = bool(data['holidays'][cd[1]-1][cd[0]-1]['dayoff'])
-                    cal_data['holiday_type'] = data['holidays'][cd[1]-1][cd[0]-1]['type']
-        except FileNotFoundError:
-            pass
-
-        home = ephem.Observer()
-        home.lat, home.lon = cal_data['latitude'], cal_data['longitude']
-        home.date = ephem.now()
-        sun = ephem.Sun()
-        sun.compute(home)
-        srp = ephem.localtime(home.previous_rising(sun))
-        srn = ephem.localtime(home.next_rising(sun))
-        ssp = ephem.localtime(home.previous_setting(sun))
-        ssn = ephem.localtime(home.next_setting(sun))
-        cal_data['sun_info'] = {}
-        cal_data['sun_info']['sunrise'] = srn if srp < btoday else srp
-        cal_data['sun_info']['sunset'] = ssn if ssn < etoday else ssp
-        cal_data['sun_info']['daylength'] = cal_data['sun_info']['sunset'] - cal_data['sun_info']['sunrise']
-
-        moon = ephem.Moon()
-        moon.compute(home)
-        mrp = ephem.localtime(home.previous_rising(moon))
-        mrn = ephem.localtime(home.next_rising(moon))
-        msp = ephem.localtime(home.previous_setting(moon))
-        msn = ephem.localtime(home.next_setting(moon))
-        cal_data['moon_info'] = {}
-        cal_data['moon_info']['moonrise'] = mrn if mrp < btoday else mrp
-        cal_data['moon_info']['moonset'] = msn if msn < etoday else msp
-
-        cal_data['moon_info']['constellation'] = ephem.constellation(moon)[0]
-
-        cal_data['moon_info']['moon_day'] = int(home.date - ephem.previous_new_moon(home.date))+1
-        cal_data['moon_info']['moon_phase_id'] = self.__get_moon_phase(home)
-
-        if weather_service:
-            weather = globals()[weather_service]()
-            cal_data['forecast'] = weather.get_forecast((cal_data['latitude'], cal_data['longitude']))
-        else:
-            cal_data['forecast'] = {}
-
-        if wifi_device:
-            wifi_qlt = wifi.get_quality('wlan0')
-            cal_data['wifi_qlt'] = round(map_to_range(wifi_qlt, 0, 100, 0, 4)) if wifi_qlt else None
-        else:
-            cal_data['wifi_qlt'] = None
-
-        cal_data['battery'] = {}
-        try:
-            import ina219
-            ups = ina219.INA219(addr=0x43)
-            cal_data['battery']['level'] = round(ups.getPercent())//10*10
-            cal_data['battery']['charging'] = ups.getCharging()
-            if cal_data['battery']['level'] < 20:
-                cal_data['battery']['level'] = 20
-            elif cal_data['battery']['level'] == 40:
-                cal_data['battery']['level'] = 30
-            elif cal_data['battery']['level'] == 70:
-                cal_data['battery']['level'] = 60
-            elif cal_data['battery']['level'] >= 90 and cal_data['battery']['charging'] == 1:
-                cal_data['battery']['level'] = 100
-        except ImportError:
-            cal_data['battery']['level'] = 'unknown'
-            cal_data['battery']['charging'] = 0
+        with metrics.span('holidays'):
+            try:
+                with open(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'misc', 'holidays_' + year + '.json'), 'rb') as f:
+                    data = json.load(f)
+                    if 'daysOff' in data and cd[0] in data["daysOff"][cd[1]-1]:
+                        cal_data['dayoff'] = True
+                    if 'holidays' in data and data['holidays'][cd[1]-1][cd[0]-1]['title'] != '':
+                        cal_data['holiday'] = True
+                        cal_data['holiday_title'] = data['holidays'][cd[1]-1][cd[0]-1]['title']
+                        cal_data['holiday_dayoff'] = bool(data['holidays'][cd[1]-1][cd[0]-1]['dayoff'])
+                        cal_data['holiday_type'] = data['holidays'][cd[1]-1][cd[0]-1]['type']
+            except FileNotFoundError:
+                pass
+
+        # Live sources are queried concurrently while astro info is looked up.
+        sources = {}
+        if live:
+            executor = ThreadPoolExecutor(max_workers=3)
+            if weather_service:
+                sources['forecast'] = executor.submit(self.__get_forecast, weather_service, (cal_data['latitude'], cal_data['longitude']), weather_merge, weather_url)
+            if wifi_device:
+                sources['wifi_qlt'] = executor.submit(self.__get_wifi_qlt)
+            sources['battery'] = executor.submit(self.__get_battery)
+            executor.shutdown(wait=False)
+
+        with metrics.span('astro'):
+            cal_data['sun_info'], cal_data['moon_info'] = astro.get(cal_data['latitude'], cal_data['longitude'], today)
+
+        cal_data['forecast'] = {}
+        cal_data['wifi_qlt'] = None
+        cal_data['battery'] = {'level': 'unknown', 'charging': 0}
+        if sources:
+            with metrics.span('deadline') as s:
+                done, not_done = wait(sources.values(), timeout=max(0, started + deadline - monotonic()))
+                for key, future in sources.items():
+                    if future in not_done:
+                        s.outcome = 'fallback'
+                        logger.warning('No {} in {}s, fallback value used'.format(key, deadline))
+                    elif future.exception() is not None:
+                        logger.error('Getting {} failed: {}'.format(key, future.exception()))
+                    else:
+                        cal_data[key] = future.result()
 
         logger.info('Calendar data collected')
 
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+from statistics import median
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError
+import registry
+from forecast import DAY_PARTS, format_temp, parse_temp
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for providers, within data.DEADLINE.
+BUDGET = 15
+
+def merge(forecasts):
+    '''
+        Day parts of forecasts in order of preference merged into one:
+        majority icon, ties go to preferred provider, with the rest of fields
+        of the provider it came from and median temperature of all
+    '''
+
+    parts = {}
+    for part in DAY_PARTS:
+        summaries = [f['parts'][part] for f in forecasts if f['parts'].get(part, {}).get('temp') is not None]
+        if not summaries:
+            parts[part] = dict(forecasts[0]['parts'][part])
+            continue
+        icons = {}
+        for summary in summaries:
+            icons[summary['icon']] = icons.get(summary['icon'], 0) + 1
+        icon = max(icons, key=icons.get)
+        merged = dict(next(s for s in summaries if s['icon'] == icon))
+        ranges = [parse_temp(s['temp']) for s in summaries]
+        min_t, max_t = median(r[0] for r in ranges), median(r[1] for r in ranges)
+        merged['temp'] = format_temp(min_t, max_t, (min_t + max_t) / 2)
+        parts[part] = merged
+    return {'order': forecasts[0]['order'], 'parts': parts}
+
+class Ensemble:
+    '''
+        Queries several providers at once. First fresh forecast within budget
+        is used, or all of them are merged
+    '''
+
+    def __init__(self, names, merge = False, budget = BUDGET, base_url = None):
+        self.names = names
+        self.base_url = base_url
+        self.merge = merge
+        self.budget = budget
+
+    def get_forecast(self, coord):
+        providers = {name: registry.weather_provider(name)(self.base_url) for name in self.names}
+        executor = ThreadPoolExecutor(max_workers=len(providers))
+        futures = {executor.submit(provider.get_forecast, coord): name for name, provider in providers.items()}
+        forecasts = {}
+        try:
+            for future in as_completed(futures, timeout=self.budget):
+                name = futures[future]
+                try:
+                    forecast = future.result()
+                except Exception as e:
+                    logger.error('{} failed: {}'.format(name, e))
+                    continue
+                if not forecast:
+                    continue
+                forecasts[name] = forecast
+                # Cached forecast of failed provider waits for fresh ones.
+                if not self.merge and providers[name].stale_since is None:
+                    logger.info('Forecast of {} taken'.format(name))
+                    return forecast
+        except TimeoutError:
+            logger.warning('No forecast of {} in {}s'.format(', '.join(n for f, n in futures.items() if not f.done()), self.budget))
+        finally:
+            # Requests in progress are left to finish in background.
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+        ranked = [forecasts[name] for name in self.names if name in forecasts]
+        if not ranked:
+            return {}
+        if self.merge:
+            logger.info('Forecasts of {} merged'.format(', '.join(n for n in self.names if n in forecasts)))
+            return merge(ranked)
+        fetched = {name: providers[name].stale_since for name in forecasts}
+        name = max(fetched, key=fetched.get)
+        logger.info('Cached forecast of {} taken'.format(name))
+        return forecasts[name]
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG)
+    ensemble = Ensemble(list(registry.WEATHER_PROVIDERS), merge=True)
+    forecast = ensemble.get_forecast(('55.755864', '37.617698'))
+    print(json.dumps(forecast, indent=4, sort_keys=True, default=str, ensure_ascii=False))
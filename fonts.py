@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+from functools import lru_cache
+from PIL import Image, ImageDraw, ImageFont
+
+logger = logging.getLogger(__name__)
+
+FONT_CACHE_SIZE = 64
+TEXTSIZE_CACHE_SIZE = 2048
+
+# Text metrics do not depend on the image drawn to, only on the mode,
+# so every measurement goes through one scratch draw of the sheets' mode.
+_scratch = ImageDraw.Draw(Image.new('1', (1, 1), 255))
+
+@lru_cache(maxsize=FONT_CACHE_SIZE)
+def get_font(path, size):
+    '''
+        Load a FreeType face once per (font file, size)
+    '''
+
+    logger.debug('Loading font {} {}'.format(path, size))
+    return ImageFont.truetype(path, size)
+
+@lru_cache(maxsize=TEXTSIZE_CACHE_SIZE)
+def textsize(path, size, text, spacing = 4):
+    '''
+        Measure text once per (font file, size, text, spacing)
+    '''
+
+    return _scratch.textsize(text, font=get_font(path, size), spacing=spacing)
+
+def cache_info():
+    return {'fonts': get_font.cache_info(), 'textsize': textsize.cache_info()}
+
+def cache_clear():
+    textsize.cache_clear()
+    get_font.cache_clear()
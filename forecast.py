@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import logging
+import metrics
+import weather_cache
+import store
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+logger = logging.getLogger(__name__)
+
+# Day parts by local hour // 6.
+DAY_PARTS = ('n', 'm', 'd', 'e')
+PART_SECONDS = 6 * 3600
+WINDOW_SECONDS = 23 * 3600
+# Streamed response is parsed this far past the window, so stale forecast
+# fills the window as long as the cache may show it.
+PARSE_AHEAD = weather_cache.MAX_STALE
+# Bytes read at once by streaming parse, smaller reads less past the window.
+PARSE_BUFFER = 4096
+
+# Fields averaged over day part, other fields take most common value.
+NUMERIC = ('temp', 'humidity', 'pressure', 'wind_speed', 'wind_deg')
+
+def add_sign(num):
+    if num > 0:
+        sign = '+'
+    else:
+        sign = ''
+    return sign+str(num)
+
+def format_temp(min_t, max_t, avg):
+    '''
+        Range of temperature if it changes by more than a degree, average otherwise
+    '''
+
+    min_t, max_t = round(min_t), round(max_t)
+    if max_t - min_t > 1:
+        return '{}°..{}°'.format(add_sign(min_t), add_sign(max_t))
+    return '{}°'.format(add_sign(round(avg)))
+
+def parse_temp(text):
+    '''
+        Min and max temperature of formatted one
+    '''
+
+    values = [int(t.strip('°')) for t in text.split('..')]
+    return values[0], values[-1]
+
+def utc_offset(timestamp):
+    return time.localtime(timestamp).tm_gmtoff
+
+def part_start(timestamp):
+    '''
+        Unix time of start of local day part of timestamp
+    '''
+
+    return timestamp - (int(timestamp) + utc_offset(timestamp)) % PART_SECONDS - timestamp % 1
+
+class Accumulator:
+    '''
+        Running min, max, sum and count of numeric fields and counters
+        of other fields of one day part
+    '''
+
+    def __init__(self, fields):
+        self.numeric = {field: [None, None, 0, 0] for field in fields if field in NUMERIC}
+        self.modal = {field: {} for field in fields if field not in NUMERIC}
+
+    def add(self, record):
+        for field, acc in self.numeric.items():
+            value = record.get(field)
+            if value is None:
+                continue
+            if acc[3] == 0:
+                acc[0] = acc[1] = value
+            elif value < acc[0]:
+                acc[0] = value
+            elif value > acc[1]:
+                acc[1] = value
+            acc[2] += value
+            acc[3] += 1
+        for field, counts in self.modal.items():
+            value = record.get(field)
+            if value is not None:
+                counts[value] = counts.get(value, 0) + 1
+
+    def average(self, field, divisor = 1):
+        acc = self.numeric[field]
+        return acc[2] / acc[3] / divisor if acc[3] else None
+
+    def summary(self, divisors = {}):
+        part = {}
+        for field in self.numeric:
+            avg = self.average(field, divisors.get(field, 1))
+            if field == 'temp':
+                if avg is None:
+                    part[field] = None
+                    continue
+                part[field] = format_temp(self.numeric[field][0], self.numeric[field][1], avg)
+            elif field == 'wind_speed':
+                part[field] = '{}'.format(round(avg)) if avg is not None else None
+            else:
+                part[field] = round(avg) if avg is not None else None
+        for field, counts in self.modal.items():
+            # Ties go to value seen first.
+            part[field] = max(counts, key=counts.get) if counts else None
+        return part
+
+def aggregate(records, not_before, not_after, fields, divisors = {}):
+    '''
+        Summary of day parts of hourly (Unix time, record) pairs sorted by time,
+        one pass over records within [not_before, not_after]
+    '''
+
+    # Offset is taken once unless window crosses change of it.
+    offset = utc_offset(not_after)
+    exact = utc_offset(not_before) != offset
+
+    order = []
+    parts = {}
+    for timestamp, record in records:
+        if timestamp < not_before:
+            continue
+        if timestamp > not_after:
+            break
+        local = int(timestamp) + (utc_offset(timestamp) if exact else offset)
+        day_part = DAY_PARTS[local // PART_SECONDS % 4]
+        acc = parts.get(day_part)
+        if acc is None:
+            acc = parts[day_part] = Accumulator(fields)
+            order.append(day_part)
+        acc.add(record)
+
+    empty = Accumulator(fields).summary(divisors)
+    return {
+        'order': order,
+        'parts': {part: parts[part].summary(divisors) if part in parts else dict(empty) for part in DAY_PARTS}}
+
+class Provider:
+    '''
+        Weather provider maps its response to hourly records,
+        requesting and aggregating is shared
+    '''
+
+    FIELDS = ('temp', 'humidity', 'pressure', 'wind_speed', 'wind_deg', 'cast', 'description', 'icon')
+    # Averages are divided by these to get units of sheet.
+    DIVISORS = {}
+    # Fetch time of cached forecast last returned instead of fresh one.
+    stale_since = None
+    # Scheme and host of API, may be replaced by e.g. local replay server.
+    BASE_URL = None
+
+    # ijson prefix of hourly items of response.
+    ITEMS = None
+
+    def __init__(self, base_url = None):
+        self.base_url = (base_url or self.BASE_URL).rstrip('/')
+
+    def request(self, coord, headers = {}):
+        '''
+            Response of provider API, headers are added to request
+        '''
+
+        raise NotImplementedError
+
+    def valid(self, weather_data):
+        return True
+
+    def items(self, weather_data):
+        '''
+            Hourly items of response
+        '''
+
+        raise NotImplementedError
+
+    def record(self, item):
+        '''
+            Unix time and record of hourly item
+        '''
+
+        raise NotImplementedError
+
+    def document(self, items):
+        '''
+            Response made of hourly items only
+        '''
+
+        raise NotImplementedError
+
+    def records(self, weather_data):
+        '''
+            Hourly (Unix time, record) pairs of response
+        '''
+
+        for item in self.items(weather_data):
+            yield self.record(item)
+
+    def parse(self, stream, until):
+        '''
+            Response of hourly items up to Unix time until streamed from file-like
+            object, the rest of it is neither parsed nor read
+        '''
+
+        items = []
+        for item in ijson.items(stream, self.ITEMS, use_float=True, buf_size=PARSE_BUFFER):
+            items.append(item)
+            if self.record(item)[0] > until:
+                break
+        return self.document(items)
+
+    def window(self, now):
+        '''
+            Day parts from the current one to 23 hours ahead
+        '''
+
+        not_before = part_start(now)
+        return not_before, not_before + WINDOW_SECONDS
+
+    def summarize(self, weather_data, now = None):
+        not_before, not_after = self.window(time.time() if now is None else now)
+        return aggregate(self.records(weather_data), not_before, not_after, self.FIELDS, self.DIVISORS)
+
+    def cached(self, entry, now):
+        '''
+            Summary of cached entry for the current window, aggregated again
+            if it was stored for another one
+        '''
+
+        not_before = self.window(now)[0]
+        if entry.get('summarized') == not_before and entry.get('summary'):
+            return entry['summary']
+        forecast = self.summarize(entry['data'], now)
+        return forecast if forecast['order'] else {}
+
+    def get_forecast(self, coord):
+        now = time.time()
+        entry = weather_cache.load(type(self).__name__, coord)
+        if entry is not None and 0 <= now - entry['fetched'] < weather_cache.TTL:
+            logger.info('Weather forecast data taken from cache')
+            return self.cached(entry, now)
+
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        try:
+            with metrics.span('weather_http'):
+                response = self.request(coord, headers)
+        except Exception as e:
+            logger.error('Error getting weather forecast data: {}'.format(e))
+            return self.stale(entry, now)
+
+        if response.status_code == 304 and entry is not None:
+            logger.info('Weather forecast data not modified')
+            entry['fetched'] = now
+            forecast = self.cached(entry, now)
+        elif response.status_code != 200:
+            logger.error('Weather forecast request failed with HTTP {}'.format(response.status_code))
+            response.close()
+            return self.stale(entry, now)
+        else:
+            try:
+                with metrics.span('weather_parse') as s:
+                    if ijson is None:
+                        weather_data = response.json()
+                    else:
+                        response.raw.decode_content = True
+                        try:
+                            weather_data = self.parse(response.raw, self.window(now)[1] + PARSE_AHEAD)
+                        finally:
+                            response.close()
+                    if not self.valid(weather_data):
+                        s.outcome = 'fallback'
+            except Exception as e:
+                # Body is read while parsed, so errors of connection show up here too.
+                logger.error('Error parsing weather forecast data: {}'.format(e))
+                return self.stale(entry, now)
+
+            if s.outcome != 'ok':
+                logger.error('Error getting weather forecast data')
+                logger.debug(weather_data)
+                return self.stale(entry, now)
+            logger.info('Weather forecast data received successfully')
+
+            forecast = self.summarize(weather_data, now)
+            with metrics.span('store'):
+                store.add_forecast(type(self).__name__, coord, now, self.records(weather_data))
+            entry = {
+                'data': weather_data,
+                'fetched': now,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified')}
+
+        entry['summary'] = forecast
+        entry['summarized'] = self.window(now)[0]
+        weather_cache.save(type(self).__name__, coord, entry)
+        return forecast
+
+    def stale(self, entry, now):
+        '''
+            Cached forecast shifted to the current window when it is not too old
+        '''
+
+        if entry is None or not 0 <= now - entry['fetched'] < weather_cache.MAX_STALE:
+            return {}
+        with metrics.span('weather_cache') as s:
+            s.outcome = 'fallback'
+            forecast = self.cached(entry, now)
+        if forecast:
+            self.stale_since = entry['fetched']
+            logger.warning('Weather forecast data fetched {:.1f} hours ago is shown'.format((now - entry['fetched']) / 3600))
+        return forecast
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+FRONT_BLACK = 'sheet_b.bin'
+FRONT_RED = 'sheet_r.bin'
+SHOWN_BLACK = 'shown_b.bin'
+SHOWN_RED = 'shown_r.bin'
+
+def write(path, buf):
+    '''
+        Write packed EPD buffer as is, replacing previous file atomically
+    '''
+
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(buf)
+    os.replace(tmp, path)
+
+def read(path, size = None):
+    '''
+        Read packed EPD buffer, None if missing or of unexpected size
+    '''
+
+    try:
+        with open(path, 'rb') as f:
+            buf = f.read()
+    except FileNotFoundError:
+        return None
+    if size is not None and len(buf) != size:
+        logger.warning('Buffer {} has {} bytes, expected {}'.format(path, len(buf), size))
+        return None
+    return buf
+
+def buffer_size(epd, bits = 1):
+    return epd.width * epd.height * bits // 8
+
+def diff_regions(old, new, width, height):
+    '''
+        Bounding boxes (x0, y0, x1, y1) of changed areas of 1-bit buffers
+        in panel coordinates, one box per band of adjacent changed rows
+    '''
+
+    stride = width // 8
+    regions = []
+    band = None
+    for y in range(height):
+        row = slice(y * stride, (y + 1) * stride)
+        a, b = old[row], new[row]
+        if a == b:
+            if band is not None:
+                regions.append(band)
+                band = None
+            continue
+        first = next(i for i in range(stride) if a[i] != b[i])
+        last = next(i for i in range(stride - 1, -1, -1) if a[i] != b[i])
+        x0, x1 = first * 8, (last + 1) * 8 - 1
+        if band is None:
+            band = (x0, y, x1, y)
+        else:
+            band = (min(band[0], x0), band[1], max(band[2], x1), y)
+    if band is not None:
+        regions.append(band)
+    return regions
+
+def union(regions):
+    if not regions:
+        return None
+    return (min(r[0] for r in regions), min(r[1] for r in regions), max(r[2] for r in regions), max(r[3] for r in regions))
+
+def crop(buf, width, region):
+    '''
+        Region widened to whole bytes of rows (x1, y1 exclusive) and its part
+        of 1-bit buffer, rows of window one after another as drivers of
+        partial update expect
+    '''
+
+    x0, y0, x1, y1 = region
+    stride = width // 8
+    b0, b1 = x0 // 8, min((x1 + 8) // 8, stride)
+    window = b''.join(bytes(buf[y * stride + b0:y * stride + b1]) for y in range(y0, y1 + 1))
+    return (b0 * 8, y0, b1 * 8, y1 + 1), window
+
+def remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import struct
+import logging
+import threading
+from array import array
+from bisect import bisect_right
+from datetime import datetime, date
+
+logger = logging.getLogger(__name__)
+
+INDEX_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'astro')
+INDEX_FILE = 'lunation.bin'
+# Years covered by new index around requested one.
+YEARS_BEFORE = 1
+YEARS_AFTER = 10
+
+MAGIC = b'PYTOCLUN'
+VERSION = 1
+# Index header: magic, version, first and last covered year, events count.
+HEADER = struct.Struct('<8sHHHI')
+
+NEW, FIRST_QUARTER, FULL, LAST_QUARTER = 0, 2, 4, 6
+
+_lock = threading.Lock()
+_index = None
+
+def build(first_year, last_year):
+    '''
+        Instants of principal moon phases of years as sorted Unix times
+        and phase ids of them
+    '''
+
+    import ephem
+
+    epoch = ephem.Date(datetime(1970, 1, 1))
+    start = ephem.Date(datetime(first_year - 1, 12, 1))
+    end = ephem.Date(datetime(last_year + 1, 2, 1))
+    events = []
+    for kind, search in ((NEW, ephem.next_new_moon), (FIRST_QUARTER, ephem.next_first_quarter_moon),
+                         (FULL, ephem.next_full_moon), (LAST_QUARTER, ephem.next_last_quarter_moon)):
+        t = search(start)
+        while t < end:
+            events.append(((t - epoch) * 86400, kind))
+            t = search(t + 1)
+    events.sort()
+    logger.info('Lunation index of {} phases for {}-{} built'.format(len(events), first_year, last_year))
+    return (first_year, last_year, array('d', (e[0] for e in events)), bytes(e[1] for e in events))
+
+def save(index, path = INDEX_PATH):
+    first_year, last_year, times, kinds = index
+    os.makedirs(path, exist_ok=True)
+    filename = os.path.join(path, INDEX_FILE)
+    # Workers of batch may save the index at once.
+    tmp = '{}.{}.tmp'.format(filename, os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, first_year, last_year, len(times)))
+        f.write(times.tobytes())
+        f.write(kinds)
+    os.replace(tmp, filename)
+
+def load(path = INDEX_PATH):
+    '''
+        Index saved to disk, None if missing or broken
+    '''
+
+    try:
+        with open(os.path.join(path, INDEX_FILE), 'rb') as f:
+            magic, version, first_year, last_year, count = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                return None
+            times = array('d')
+            times.frombytes(f.read(count * times.itemsize))
+            kinds = f.read(count)
+    except (FileNotFoundError, struct.error, ValueError):
+        return None
+    if len(times) != count or len(kinds) != count:
+        return None
+    return (first_year, last_year, times, kinds)
+
+def get_index(year, path = INDEX_PATH):
+    '''
+        Index covering the year, loaded from disk or built and saved once
+    '''
+
+    global _index
+    with _lock:
+        for index in (_index, load(path) if _index is None else None):
+            if index is not None and index[0] <= year <= index[1]:
+                _index = index
+                return index
+        _index = build(year - YEARS_BEFORE, year + YEARS_AFTER)
+        try:
+            save(_index, path)
+        except OSError as e:
+            logger.warning('Lunation index not saved: {}'.format(e))
+        return _index
+
+def lookup(timestamp, path = INDEX_PATH):
+    '''
+        Moon day and phase id at Unix time
+    '''
+
+    first_year, last_year, times, kinds = get_index(datetime.fromtimestamp(timestamp).year, path)
+    i = bisect_right(times, timestamp)
+    previous_event, next_event = i - 1, i
+
+    # Principal phase is shown for the whole local day it falls on.
+    day = date.fromtimestamp(timestamp)
+    if date.fromtimestamp(times[previous_event]) == day:
+        phase = kinds[previous_event]
+    elif date.fromtimestamp(times[next_event]) == day:
+        phase = kinds[next_event]
+    else:
+        phase = (kinds[next_event] - 1) % 8
+
+    previous_new = previous_event
+    while kinds[previous_new] != NEW:
+        previous_new -= 1
+    moon_day = int((timestamp - times[previous_new]) / 86400) + 1
+    return (moon_day, phase)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+logger = logging.getLogger(__name__)
+
+JSONL_FILE = 'pytoc_metrics.jsonl'
+PROM_FILE = 'pytoc_{}.prom'
+
+_lock = threading.Lock()
+_records = []
+_started = time.time()
+
+class Span:
+    def __init__(self, name):
+        self.name = name
+        self.outcome = 'ok'
+        self.start = time.time()
+        self.duration = None
+
+@contextmanager
+def span(name):
+    '''
+        Time stage of run. Outcome is 'error' when stage raises,
+        stage itself may set other outcome, e.g. 'fallback'
+    '''
+
+    s = Span(name)
+    start = time.perf_counter()
+    try:
+        yield s
+    except BaseException:
+        s.outcome = 'error'
+        raise
+    finally:
+        s.duration = time.perf_counter() - start
+        with _lock:
+            _records.append(s)
+        logger.debug('{} {} in {:.3f}s'.format(name, s.outcome, s.duration))
+
+def timed(name):
+    '''
+        Decorator running function in span
+    '''
+
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def records():
+    with _lock:
+        return list(_records)
+
+def reset():
+    global _started
+    with _lock:
+        _records.clear()
+        _started = time.time()
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def write(path, run = 'cal', outcome = 'ok'):
+    '''
+        Append run record to JSON lines file and replace Prometheus textfile
+    '''
+
+    spans = records()
+    finished = time.time()
+    record = {
+        'run': run,
+        'outcome': outcome,
+        'started': _started,
+        'duration': finished - _started,
+        'stages': [{'stage': s.name, 'start': s.start, 'duration': s.duration, 'outcome': s.outcome} for s in spans]}
+
+    stages = {}
+    for s in spans:
+        stage = stages.setdefault(s.name, {'duration': 0, 'calls': 0, 'errors': 0, 'outcome': 'ok'})
+        stage['duration'] += s.duration
+        stage['calls'] += 1
+        if s.outcome != 'ok':
+            stage['errors'] += s.outcome == 'error'
+            stage['outcome'] = s.outcome
+
+    lines = [
+        '# HELP pytoc_run_timestamp_seconds Start of last run.',
+        '# TYPE pytoc_run_timestamp_seconds gauge',
+        'pytoc_run_timestamp_seconds{{run="{}"}} {:.3f}'.format(_escape(run), _started),
+        '# HELP pytoc_run_duration_seconds Duration of last run.',
+        '# TYPE pytoc_run_duration_seconds gauge',
+        'pytoc_run_duration_seconds{{run="{}"}} {:.6f}'.format(_escape(run), record['duration']),
+        '# HELP pytoc_run_success Whether last run completed.',
+        '# TYPE pytoc_run_success gauge',
+        'pytoc_run_success{{run="{}"}} {}'.format(_escape(run), int(outcome == 'ok')),
+        '# HELP pytoc_stage_duration_seconds Total duration of stage in last run.',
+        '# TYPE pytoc_stage_duration_seconds gauge']
+    for name, stage in sorted(stages.items()):
+        lines.append('pytoc_stage_duration_seconds{{run="{}",stage="{}",outcome="{}"}} {:.6f}'.format(_escape(run), _escape(name), _escape(stage['outcome']), stage['duration']))
+    lines += [
+        '# HELP pytoc_stage_calls Times stage ran in last run.',
+        '# TYPE pytoc_stage_calls gauge']
+    for name, stage in sorted(stages.items()):
+        lines.append('pytoc_stage_calls{{run="{}",stage="{}"}} {}'.format(_escape(run), _escape(name), stage['calls']))
+    lines += [
+        '# HELP pytoc_stage_errors Times stage failed in last run.',
+        '# TYPE pytoc_stage_errors gauge']
+    for name, stage in sorted(stages.items()):
+        lines.append('pytoc_stage_errors{{run="{}",stage="{}"}} {}'.format(_escape(run), _escape(name), stage['errors']))
+
+    try:
+        with open(os.path.join(path, JSONL_FILE), 'a') as f:
+            f.write(json.dumps(record) + '\n')
+        # Textfile collector may read at any moment, so replace file atomically.
+        prom = os.path.join(path, PROM_FILE.format(run))
+        with open(prom + '.tmp', 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(prom + '.tmp', prom)
+    except OSError as e:
+        logger.error('Metrics not written: {}'.format(e))
+    else:
+        logger.debug('Metrics of {} stages written to {}'.format(len(spans), path))
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import random
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Connect and read timeouts of one attempt.
+TIMEOUT = (10, 30)
+# Seconds all attempts of request may take, within data.DEADLINE.
+BUDGET = 15
+RETRIES = 3
+# Backoff before attempt n is random up to BACKOFF * 2**n, at most BACKOFF_MAX.
+BACKOFF = 0.5
+BACKOFF_MAX = 4
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+_lock = threading.Lock()
+_session = None
+
+def session():
+    '''
+        Shared session keeping connections to hosts alive between requests
+    '''
+
+    global _session
+    with _lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4)
+            _session.mount('https://', adapter)
+            _session.mount('http://', adapter)
+            _session.headers['Accept-Encoding'] = 'gzip, deflate'
+        return _session
+
+def backoff(attempt, response = None):
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF * 2 ** attempt))
+    if response is not None:
+        try:
+            delay = max(delay, float(response.headers.get('Retry-After', 0)))
+        except ValueError:
+            pass
+    return delay
+
+def get(url, budget = BUDGET, retries = RETRIES, timeout = TIMEOUT, **kwargs):
+    '''
+        GET through shared session retrying connection errors, timeouts and
+        transient statuses with jittered backoff while budget lasts.
+        Response of last attempt is returned even if status is transient
+    '''
+
+    deadline = time.monotonic() + budget
+    attempt = 0
+    while True:
+        left = deadline - time.monotonic()
+        try:
+            response = session().get(url, timeout=tuple(min(t, left) for t in timeout), **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt >= retries:
+                raise
+            error, response = e, None
+        else:
+            if response.status_code not in RETRY_STATUS or attempt >= retries:
+                return response
+            error = 'status {}'.format(response.status_code)
+
+        delay = backoff(attempt, response)
+        if time.monotonic() + delay >= deadline:
+            logger.warning('{} failed with {}, no time left to retry'.format(url, error))
+            if response is None:
+                raise error
+            return response
+        logger.warning('{} failed with {}, retry in {:.1f}s'.format(url, error, delay))
+        if response is not None:
+            response.close()
+        time.sleep(delay)
+        attempt += 1
@@ -2,44 +2,23 @@
 # -*- coding: utf-8 -*-
 
 import logging
-import requests
-from datetime import datetime, timedelta
+import net
 from owm_cfg import api_key
+import sys
 import json
+from forecast import Provider, part_start, WINDOW_SECONDS
 
 logger = logging.getLogger(__name__)
 
-class OWM:
+class OWM(Provider):
 
-    @staticmethod
-    def __get_daypart(date):
-        hour = int(date.strftime('%-H'))
-        if 0 <= hour < 6:
-            return 'n'
-        if 6 <= hour < 12:
-            return 'm'
-        if 12 <= hour < 18:
-            return 'd'
-        if 18 <= hour <= 23:
-            return 'e'
+    FIELDS = ('temp', 'humidity', 'pressure', 'wind_speed', 'wind_deg', 'cast', 'description', 'code', 'icon')
+    # hPa to mm Hg.
+    DIVISORS = {'pressure': 1.333}
+    BASE_URL = 'https://api.openweathermap.org'
+    ITEMS = 'hourly.item'
 
-    @staticmethod
-    def __most_common(lst):
-        return max(set(lst), key = lst.count)
-
-    @staticmethod
-    def __average(lst):
-        return sum(lst) / len(lst)
-
-    @staticmethod
-    def __add_sign(num):
-        if num > 0:
-            sign = '+'
-        else:
-            sign = ''
-        return sign+str(num)
-
-    def get_forecast(self, coord):
+    def request(self, coord, headers = {}):
         payload = {
             'lat': coord[0],
             'lon': coord[1],
@@ -47,65 +26,35 @@ class OWM:
             'units': 'metric',
             'lang': 'ru',
             'exclude': 'current,minutely,daily'}
-        try:
-            response = requests.get('https://api.openweathermap.org/data/2.5/onecall', params=payload, timeout=(10,30))
-        except Exception as e:
-            logger.error('Error getting weather forecast data')
-            return {}
-        else:
-            weather_data = response.json()
-            logger.info('Weather forecast data received successfully')
+        return net.get(self.base_url + '/data/2.5/onecall', headers=headers, params=payload, stream=True)
 
-        until = datetime.now() + timedelta(hours=23)
+    def valid(self, weather_data):
+        return bool(weather_data.get('hourly'))
 
-        summary = {
-            'order' : [],
-            'parts': {
-                'n': {'temp':[], 'humidity':[], 'pressure':[], 'wind_speed':[], 'wind_deg':[], 'cast':[], 'description':[], 'code':[], 'icon':[]},
-                'm': {'temp':[], 'humidity':[], 'pressure':[], 'wind_speed':[], 'wind_deg':[], 'cast':[], 'description':[], 'code':[], 'icon':[]},
-                'd': {'temp':[], 'humidity':[], 'pressure':[], 'wind_speed':[], 'wind_deg':[], 'cast':[], 'description':[], 'code':[], 'icon':[]},
-                'e': {'temp':[], 'humidity':[], 'pressure':[], 'wind_speed':[], 'wind_deg':[], 'cast':[], 'description':[], 'code':[], 'icon':[]}}}
+    def window(self, now):
+        # Hourly forecast starts from the current hour.
+        return part_start(now), now + WINDOW_SECONDS
 
-        for item in weather_data.get('hourly'):
-            date = datetime.fromtimestamp(item['dt'])
-            if date <= until:
-                day_part = self.__get_daypart(date)
-                if day_part not in summary['order']:
-                    summary['order'].append(day_part)
-                summary['parts'][day_part]['temp'].append(item['temp'])
-                summary['parts'][day_part]['humidity'].append(item['humidity'])
-                summary['parts'][day_part]['pressure'].append(item['pressure'])
-                summary['parts'][day_part]['wind_speed'].append(item['wind_speed'])
-                summary['parts'][day_part]['wind_deg'].append(item['wind_deg'])
-                summary['parts'][day_part]['cast'].append(item['weather'][0]['main'])
-                summary['parts'][day_part]['description'].append(item['weather'][0]['description'])
-                summary['parts'][day_part]['code'].append(item['weather'][0]['id'])
-                summary['parts'][day_part]['icon'].append(item['weather'][0]['icon'])
-            else:
-                break
+    def items(self, weather_data):
+        return weather_data['hourly']
 
-        for s_key in summary['parts']:
-            for key in summary['parts'][s_key]:
-                if key == 'temp':
-                    min_t = round(min(summary['parts'][s_key][key]))
-                    max_t = round(max(summary['parts'][s_key][key]))
-                    if max_t - min_t > 1:
-                        summary['parts'][s_key][key] = '{}°..{}°'.format(self.__add_sign(min_t), self.__add_sign(max_t))
-                    else:
-                        summary['parts'][s_key][key] = '{}°'.format(self.__add_sign(round(self.__average(summary['parts'][s_key][key]))))
-                elif key == 'pressure':
-                    summary['parts'][s_key][key] = round(self.__average(summary['parts'][s_key][key])/1.333)
-                elif key == 'wind_speed':
-                    summary['parts'][s_key][key] = '{}'.format(round(self.__average(summary['parts'][s_key][key])))
-                elif key in ('humidity', 'wind_deg'):
-                    summary['parts'][s_key][key] = round(self.__average(summary['parts'][s_key][key]))
-                else:
-                    summary['parts'][s_key][key] = self.__most_common(summary['parts'][s_key][key])
+    def record(self, item):
+        return item['dt'], {
+            'temp': item['temp'],
+            'humidity': item['humidity'],
+            'pressure': item['pressure'],
+            'wind_speed': item['wind_speed'],
+            'wind_deg': item['wind_deg'],
+            'cast': item['weather'][0]['main'],
+            'description': item['weather'][0]['description'],
+            'code': item['weather'][0]['id'],
+            'icon': item['weather'][0]['icon']}
 
-        return summary
+    def document(self, items):
+        return {'hourly': items}
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.DEBUG)
-    owm = OWM()
+    owm = OWM(*sys.argv[1:2])
     forecast = owm.get_forecast(('55.755864', '37.617698'))
     print(json.dumps(forecast, indent=4, sort_keys=True, default=str, ensure_ascii=False))
\ No newline at end of file
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Drivers storing black as set bit in 1-bit buffers.
+INVERTED_1BIT = ('epd7in5b_V2', 'epd7in5_V2')
+
+_INVERT = bytes(b ^ 0xFF for b in range(256))
+
+# Waveshare 4-gray drivers map 0xC0 to 0x80 and 0x80 to 0x40 and then
+# take two upper bits of the pixel.
+_GRAY_CODES = bytes(((0x80 if v == 0xC0 else 0x40 if v == 0x80 else v) & 0xC0) >> 6 for v in range(256))
+
+def _orient(image, width, height):
+    if image.size == (width, height):
+        return image
+    if image.size == (height, width):
+        return image.transpose(Image.Transpose.ROTATE_90)
+    raise ValueError('Image size {}x{} does not fit {}x{} panel'.format(image.size[0], image.size[1], width, height))
+
+def pack_1bit(image, width, height, invert = False):
+    '''
+        Pack image into 1-bit EPD buffer, MSB first, set bit is white.
+        Image of panel size turned by 90 degrees is rotated as drivers do.
+    '''
+
+    buf = _orient(image.convert('1'), width, height).tobytes()
+    if invert:
+        buf = buf.translate(_INVERT)
+    return buf
+
+def pack_4gray(image, width, height):
+    '''
+        Pack image into 2-bit 4-gray EPD buffer, four pixels per byte
+    '''
+
+    # Only back page needs numpy, keep it out of front page start.
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+
+    codes = _orient(image.convert('L'), width, height).tobytes().translate(_GRAY_CODES)
+    if np is not None:
+        c = np.frombuffer(codes, dtype=np.uint8).reshape(-1, 4)
+        return ((c[:, 0] << 6) | (c[:, 1] << 4) | (c[:, 2] << 2) | c[:, 3]).astype(np.uint8).tobytes()
+    return bytes(a << 6 | b << 4 | c << 2 | d for a, b, c, d in zip(codes[0::4], codes[1::4], codes[2::4], codes[3::4]))
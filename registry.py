@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import random
+import logging
+import importlib
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Names are resolved to classes on first use only, so a run imports
+# requests, lxml and the API keys of just the plugins it uses.
+WEATHER_PROVIDERS = {
+    'OWM': ('owm', 'OWM'),
+    'GM': ('gm', 'GM'),
+    'YW': ('yw', 'YW')}
+
+BACKPAGES = {
+    'xkcd': ('backpage.xkcd', 'XKCD'),
+    'bashorg': ('backpage.bashorg', 'BashOrg'),
+    'dummy': ('backpage.dummy', 'Dummy')}
+
+@lru_cache(maxsize=None)
+def _resolve(module, name):
+    logger.debug('Loading {}.{}'.format(module, name))
+    return getattr(importlib.import_module(module), name)
+
+def weather_provider(name):
+    if name not in WEATHER_PROVIDERS:
+        raise ValueError('Unknown weather service {}, expected one of {}'.format(name, ', '.join(WEATHER_PROVIDERS)))
+    return _resolve(*WEATHER_PROVIDERS[name])
+
+def forecast_source(spec, merge = False, base_url = None):
+    '''
+        Provider of forecast by name, or ensemble of comma separated names
+        taking first forecast or merging them all, base_url replaces
+        the one of API
+    '''
+
+    names = [name.strip() for name in spec.split(',')]
+    if len(names) == 1:
+        return weather_provider(names[0])(base_url)
+    for name in names:
+        weather_provider(name)
+    return _resolve('ensemble', 'Ensemble')(names, merge, base_url=base_url)
+
+def backpage(name):
+    if name not in BACKPAGES:
+        raise ValueError('Unknown backpage {}, expected one of {}'.format(name, ', '.join(BACKPAGES)))
+    return _resolve(*BACKPAGES[name])
+
+def default_backpages(template):
+    if "7in5" in template:
+        return ['dummy']
+    return ['xkcd', 'dummy']
+
+def choose_backpage(names, w, h, image_path):
+    '''
+        Instance of randomly chosen backpage of names
+    '''
+
+    return backpage(random.choice(names))(w = w, h = h, image_path = image_path)
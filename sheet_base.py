@@ -2,17 +2,94 @@
 # -*- coding: utf-8 -*-
 
 import os
+import json
+import hashlib
+import inspect
 import logging
+from collections import namedtuple
+from functools import lru_cache
 from string import Template
-from PIL import Image, ImageDraw, ImageFont
-import textwrap
+from PIL import Image, ImageDraw
 import time
+import fonts
+import assets
+import textfit
+import framebuffer
+import packing
+import metrics
 
 logger = logging.getLogger(__name__)
 
 class DeltaTemplate(Template):
     delimiter = "%"
 
+Anchor = namedtuple('Anchor', ['side', 'offset'])
+
+# Step of compiled render plan: draw_* method name, plane the element goes to,
+# condition on data, static arguments and dotted data paths of dynamic ones.
+# Steps without dynamic arguments go to the cached background layer, steps
+# depending on live data are redrawn over prerendered sheet.
+PlanStep = namedtuple('PlanStep', ['name', 'method', 'targets', 'plane', 'when', 'static', 'dynamic', 'background', 'live'])
+
+# Data which is stale by the time prerendered sheet is shown.
+LIVE_DATA = ('forecast', 'wifi_qlt', 'battery')
+
+# Sheet of the next day is prerendered by runs from this hour on.
+PRERENDER_HOUR = 18
+PRERENDER_DIR = 'next'
+PRERENDER_DATA = 'data.json'
+
+# Static background layers shared by all sheets of the process.
+_backgrounds = {}
+
+@lru_cache(maxsize=None)
+def parse_anchor(value):
+    '''
+        Parse 'c', 'r-N' and 'd-N' position anchors
+    '''
+
+    if isinstance(value, str):
+        if value.startswith('c'):
+            return Anchor('c', 0)
+        if value.startswith('r-') or value.startswith('d-'):
+            return Anchor(value[0], int(value.split('-')[1]))
+        return int(value)
+    return value
+
+@lru_cache(maxsize=None)
+def load_layout(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def load_cal_data(path):
+    '''
+        Read cal_data dumped as JSON by data.py
+    '''
+
+    from datetime import datetime, timedelta
+
+    with open(path, 'r') as f:
+        cal_data = json.load(f)
+    cal_data['moon_info']['moonrise'] = datetime.fromisoformat(cal_data['moon_info']['moonrise'])
+    cal_data['moon_info']['moonset'] = datetime.fromisoformat(cal_data['moon_info']['moonset'])
+    cal_data['sun_info']['sunrise'] = datetime.fromisoformat(cal_data['sun_info']['sunrise'])
+    cal_data['sun_info']['sunset'] = datetime.fromisoformat(cal_data['sun_info']['sunset'])
+    hours, minutes, seconds = cal_data['sun_info']['daylength'].split(':')
+    cal_data['sun_info']['daylength'] = timedelta(hours=int(hours), minutes=int(minutes), seconds=float(seconds))
+    return cal_data
+
+def load_sheet(template, image_path = ''):
+    '''
+        Sheet of template module sheet_<template> or of bare layout file
+    '''
+
+    try:
+        return __import__('sheet_' + template, globals(), locals(), ['TearOffCalendarSheet']).TearOffCalendarSheet(image_path)
+    except ModuleNotFoundError as e:
+        if e.name != 'sheet_' + template:
+            raise
+    return TearOffCalendarBaseSheet(image_path, layout=template)
+
 class TearOffCalendarBaseSheet:
     MONTHS = ['январь','февраль','март','апрель','май','июнь','июль','август','сентябрь','октябрь','ноябрь','декабрь']
     WEEKDAYS = ['воскресенье','понедельник','вторник','среда','четверг','пятница','суббота']
@@ -59,20 +136,35 @@ class TearOffCalendarBaseSheet:
         t = DeltaTemplate(fmt)
         return t.substitute(**d)
 
-    def __init__(self, image_path = ''):
+    def __init__(self, image_path = '', layout = None):
         self.__backpage_name = ''
         p = os.path.dirname(os.path.realpath(__file__))
         self.clip_path = os.path.join(p, 'clip')
         self.fonts_path = os.path.join(p, 'fonts')
         self.icons_path = os.path.join(p, 'icons')
+        self.layouts_path = os.path.join(p, 'layouts')
         self.image_path = image_path
+        self.plan = None
+        self.background_on_disk = False
+        self.debug_png = False
+        self.buffers = None
+
+        if layout is not None:
+            self.layout = layout
+        if getattr(self, 'layout', None):
+            self.spec = load_layout(os.path.join(self.layouts_path, self.layout + '.json'))
+            self.hw_screen = self.spec['hw_screen']
+            self.page_w = self.spec['page_w']
+            self.page_h = self.spec['page_h']
+            self.clip_path = self.clip_path + self.spec.get('assets_suffix', '')
+            self.icons_path = self.icons_path + self.spec.get('assets_suffix', '')
 
         self.screen = True
         if hasattr(self, 'hw_screen') and len(self.hw_screen) == 2:
             try:
                 self.epd = getattr(__import__('waveshare_epd', fromlist=self.hw_screen[0:1]), ''.join(self.hw_screen[0:1])).EPD()
                 self.epd_b = getattr(__import__('waveshare_epd', fromlist=self.hw_screen[1:2]), ''.join(self.hw_screen[1:2])).EPD()
-            except ImportError:
+            except (ImportError, AttributeError):
                 self.screen = False
                 logger.debug('There is no HW screen to draw on. Image will be saved to ' + self.image_path)
         else:
@@ -89,6 +181,9 @@ class TearOffCalendarBaseSheet:
                 self.page_w = 300
                 self.page_h = 400
 
+        if getattr(self, 'spec', None):
+            self.plan = self.compile_layout(self.spec)
+
     @property
     def backpage_name(self):
         return self.__backpage_name
@@ -100,15 +195,169 @@ class TearOffCalendarBaseSheet:
         else:
             raise ValueError
 
+    def font(self, fontname, fontsize):
+        return fonts.get_font(os.path.join(self.fonts_path, fontname), fontsize)
+
+    def textsize(self, text, fontname, fontsize):
+        return fonts.textsize(os.path.join(self.fonts_path, fontname), fontsize, text)
+
     def adjust_fontsize_by_width(self, draw, width, fontname, fontsize, text):
-        while True:
-            font = ImageFont.truetype(os.path.join(self.fonts_path, fontname), fontsize)
-            text_w, text_h = draw.textsize(text, font=font)
-            if text_w > width:
-                fontsize -= 1
-            else:
-                break
-        return fontsize
+        return textfit.fit_fontsize(os.path.join(self.fonts_path, fontname), text, width, None, fontsize)[0]
+
+    def resolve_x(self, x, width):
+        x = parse_anchor(x)
+        if isinstance(x, Anchor):
+            if x.side == 'c':
+                return (self.page_w - width) / 2
+            return self.page_w - width - x.offset
+        return x
+
+    def resolve_y(self, y, height):
+        y = parse_anchor(y)
+        if isinstance(y, Anchor):
+            if y.side == 'c':
+                return (self.page_h - height) / 2
+            return self.page_h - height - y.offset
+        return y
+
+    def compile_layout(self, spec):
+        '''
+            Compile layout spec into render plan
+        '''
+
+        plan = []
+        for element in spec['elements']:
+            name = 'draw_' + element['draw']
+            method = getattr(self, name)
+            data = element.get('data', {})
+            targets, static, dynamic = [], {}, {}
+            for param, p in inspect.signature(method).parameters.items():
+                if param in ('page', 'draw'):
+                    targets.append(param)
+                elif param in element:
+                    value = element[param]
+                    if isinstance(value, list):
+                        value = tuple(value)
+                    elif param in ('x', 'y'):
+                        value = parse_anchor(value)
+                    static[param] = value
+                elif param in data:
+                    dynamic[param] = tuple(data[param].split('.'))
+                elif p.default is inspect.Parameter.empty:
+                    dynamic[param] = (param,)
+            for prefix in ('', 'icon_'):
+                if prefix + 'fontname' in static and prefix + 'fontsize' in static:
+                    try:
+                        self.font(static[prefix + 'fontname'], static[prefix + 'fontsize'])
+                    except OSError:
+                        logger.warning('Font {} used by {} not found'.format(static[prefix + 'fontname'], name))
+            uses = set(path[0] for path in dynamic.values())
+            if element.get('when'):
+                uses.add(element['when'].lstrip('!'))
+            live = not uses.isdisjoint(LIVE_DATA)
+            plan.append(PlanStep(name, method, tuple(targets), element.get('plane', 'black'), element.get('when'), static, dynamic, not dynamic, live))
+        self.background_steps = [step for step in plan if step.background]
+        self.dynamic_steps = [step for step in plan if not step.background]
+        self.live_steps = [step for step in plan if step.live]
+        self.background_hash = hashlib.md5(repr([(step.name, step.plane, step.when, sorted(step.static.items())) for step in self.background_steps]).encode()).hexdigest()[:8]
+        logger.debug('Layout compiled into {} steps, {} of them static'.format(len(plan), len(self.background_steps)))
+        return plan
+
+    def plan_context(self):
+        context = dict(self.cal_data)
+        context['backpage_name'] = self.backpage_name
+        return context
+
+    @staticmethod
+    def lookup(context, path):
+        value = context
+        for key in path:
+            value = value[key]
+        return value
+
+    @staticmethod
+    def check(context, when):
+        if when is None:
+            return True
+        if when.startswith('!'):
+            return not context.get(when[1:])
+        return bool(context.get(when))
+
+    def plane(self, name):
+        return {'black': self.BLACK, 'red': self.RED, 'i': self.i, 'j': self.j}[name]
+
+    def render_plan(self, plan, context, pages, draws):
+        '''
+            Draw fields by compiled render plan
+        '''
+
+        for step in plan:
+            if not self.check(context, step.when):
+                continue
+            plane = self.plane(step.plane)
+            kwargs = dict(step.static)
+            for param, path in step.dynamic.items():
+                kwargs[param] = self.lookup(context, path)
+            if 'page' in step.targets:
+                kwargs['page'] = pages[plane]
+            if 'draw' in step.targets:
+                kwargs['draw'] = draws[plane]
+            step.method(**kwargs)
+
+    def background(self, context):
+        '''
+            Static layer of template for current plane choice
+        '''
+
+        conditions = tuple(self.check(context, step.when) for step in self.background_steps)
+        key = (self.layout, self.background_hash, self.page_w, self.page_h, self.i, self.j, conditions)
+        pages = _backgrounds.get(key)
+        if pages is None:
+            filename = 'bg_{}_{}_{}x{}_{}{}_{}'.format(self.layout, self.background_hash, self.page_w, self.page_h, self.i, self.j, ''.join(str(int(c)) for c in conditions))
+            if self.background_on_disk:
+                pages = self.load_background(filename)
+            if pages is None:
+                pages = (
+                    Image.new('1', (self.page_w, self.page_h), 255),
+                    Image.new('1', (self.page_w, self.page_h), 255)
+                )
+                with metrics.span('background'):
+                    self.render_plan(self.background_steps, context, pages, (ImageDraw.Draw(pages[self.BLACK]), ImageDraw.Draw(pages[self.RED])))
+                logger.debug('Background layer rendered')
+                if self.background_on_disk:
+                    self.save_background(filename, pages)
+            _backgrounds[key] = pages
+        return pages
+
+    def load_background(self, filename):
+        try:
+            pages = (
+                Image.open(os.path.join(self.image_path, filename + '_b.png')),
+                Image.open(os.path.join(self.image_path, filename + '_r.png'))
+            )
+            for page in pages:
+                page.load()
+        except (FileNotFoundError, OSError):
+            return None
+        if any(page.mode != '1' or page.size != (self.page_w, self.page_h) for page in pages):
+            return None
+        logger.debug('Background layer loaded from files')
+        return pages
+
+    def save_background(self, filename, pages):
+        try:
+            pages[self.BLACK].save(os.path.join(self.image_path, filename + '_b.png'))
+            pages[self.RED].save(os.path.join(self.image_path, filename + '_r.png'))
+        except OSError as e:
+            logger.warning('Background layer not saved: {}'.format(e))
+
+    def choose_planes(self):
+        # Where to draw parts that may be red.
+        self.i = 0 if not self.cal_data['dayoff'] or not self.screen else 1
+        self.j = 0 if not self.cal_data['holiday_dayoff'] or not self.screen else 1
+        logger.debug('Red goes on black for day: ' + ('yes' if self.i == 0 else 'no'))
+        if self.cal_data['holiday']:
+            logger.debug('Red goes on black for holiday: ' + ('yes' if self.j == 0 else 'no'))
 
     def draw(self, cal_data = None):
         if cal_data is None:
@@ -118,36 +367,127 @@ class TearOffCalendarBaseSheet:
         else:
             self.cal_data = cal_data
 
-        self.pages = (
-                    Image.new('1', (self.page_w, self.page_h), 255),
-                    Image.new('1', (self.page_w, self.page_h), 255)
-                )
-        self.draw = (
+        self.choose_planes()
+
+        if self.plan is not None:
+            context = self.plan_context()
+            self.pages = tuple(page.copy() for page in self.background(context))
+        else:
+            self.pages = (
+                        Image.new('1', (self.page_w, self.page_h), 255),
+                        Image.new('1', (self.page_w, self.page_h), 255)
+                    )
+        self.draws = (
                     ImageDraw.Draw(self.pages[self.BLACK]),
                     ImageDraw.Draw(self.pages[self.RED])
                 )
 
-        # Where to draw parts that may be red.
-        self.i = 0 if not self.cal_data['dayoff'] or not self.screen else 1
-        self.j = 0 if not self.cal_data['holiday_dayoff'] or not self.screen else 1
-        logger.debug('Red goes on black for day: ' + ('yes' if self.i == 0 else 'no'))
+        if self.plan is not None:
+            with metrics.span('render'):
+                self.render_plan(self.dynamic_steps, context, self.pages, self.draws)
+            self.save()
 
-    def draw_decor_corners(self, page, margin):
+    def prerender(self, day, backpages):
         '''
-            Draw corners
+            Render sheet and backpage of day ahead. Planes without live
+            fields and data snapshot go to PRERENDER_DIR.
         '''
 
-        corner = Image.open(os.path.join(self.clip_path, 'corner.png'), mode='r')
-        page.paste(corner, (margin, margin), corner)
+        import registry
+        from data import TearOffCalendarData
+
+        if self.plan is None:
+            logger.error('Sheet without layout can not be prerendered')
+            return
+        path = os.path.join(self.image_path, PRERENDER_DIR)
+        os.makedirs(path, exist_ok=True)
+        framebuffer.remove(os.path.join(path, PRERENDER_DATA))
+
+        backsheet = registry.choose_backpage(backpages, self.page_w, self.page_h, path)
+        self.cal_data = TearOffCalendarData().get_data(day, live=False)
+        self.backpage_name = backsheet.name
+        self.choose_planes()
+        context = self.plan_context()
+
+        # Live data is not known ahead, its fields are always drawn when shown.
+        with metrics.span('prerender'):
+            base = (
+                        Image.new('1', (self.page_w, self.page_h), 255),
+                        Image.new('1', (self.page_w, self.page_h), 255)
+                    )
+            self.render_plan([step for step in self.plan if not step.live], context, base, (ImageDraw.Draw(base[self.BLACK]), ImageDraw.Draw(base[self.RED])))
+            base[self.BLACK].save(os.path.join(path, 'base_b.png'))
+            base[self.RED].save(os.path.join(path, 'base_r.png'))
+
+        try:
+            backsheet.draw()
+        except SystemError as e:
+            logger.error(e)
+
+        # Snapshot goes last, sheet without it is not complete.
+        snapshot = dict(self.cal_data, layout=self.layout, date=day.isoformat(), backpage_name=self.backpage_name)
+        with open(os.path.join(path, PRERENDER_DATA + '.tmp'), 'w') as f:
+            json.dump(snapshot, f, default=str, ensure_ascii=False)
+        os.replace(os.path.join(path, PRERENDER_DATA + '.tmp'), os.path.join(path, PRERENDER_DATA))
+        logger.info('Sheet of {} prerendered'.format(day))
+
+    def draw_prerendered(self, cal_data, day = None):
+        '''
+            Draw sheet prerendered for the day (today by default) with live
+            fields of cal_data over it. False if there is no such sheet.
+        '''
+
+        from datetime import date
+
+        path = os.path.join(self.image_path, PRERENDER_DIR)
+        day = day or date.today()
+        try:
+            snapshot = load_cal_data(os.path.join(path, PRERENDER_DATA))
+            base = (
+                        Image.open(os.path.join(path, 'base_b.png')),
+                        Image.open(os.path.join(path, 'base_r.png'))
+                    )
+            for page in base:
+                page.load()
+        except (OSError, ValueError, KeyError):
+            return False
+        if snapshot.get('layout') != self.layout or snapshot.get('date') != day.isoformat() or snapshot['location'] != cal_data['location']:
+            logger.debug('Prerendered sheet is not of this day')
+            return False
+
+        self.cal_data = snapshot
+        self.backpage_name = snapshot['backpage_name']
+        self.choose_planes()
+
+        logger.info('Live fields drawn over prerendered sheet')
+        for key in LIVE_DATA:
+            self.cal_data[key] = cal_data.get(key)
+        self.pages = base
+        self.draws = (
+                    ImageDraw.Draw(self.pages[self.BLACK]),
+                    ImageDraw.Draw(self.pages[self.RED])
+                )
+        with metrics.span('render'):
+            self.render_plan(self.live_steps, self.plan_context(), self.pages, self.draws)
+        self.save()
 
-        corner = corner.rotate(270)
-        page.paste(corner, (self.page_w - corner.width - margin, margin), corner)
+        try:
+            os.replace(os.path.join(path, 'backsheet.png'), os.path.join(self.image_path, 'backsheet.png'))
+        except FileNotFoundError:
+            logger.warning('Prerendered sheet has no backpage')
+        framebuffer.remove(os.path.join(path, PRERENDER_DATA))
+        return True
 
-        corner = corner.rotate(180)
-        page.paste(corner, (margin, self.page_h - corner.height - margin), corner)
+    def draw_decor_corners(self, page, margin):
+        '''
+            Draw corners
+        '''
 
-        corner = corner.rotate(90)
-        page.paste(corner, (self.page_w - corner.width - margin, self.page_h - corner.height - margin), corner)
+        top_left, top_right, bottom_left, bottom_right = assets.corners(os.path.join(self.clip_path, 'corner.png'))
+        page.paste(top_left, (margin, margin), top_left)
+        page.paste(top_right, (self.page_w - top_right.width - margin, margin), top_right)
+        page.paste(bottom_left, (margin, self.page_h - bottom_left.height - margin), bottom_left)
+        page.paste(bottom_right, (self.page_w - bottom_right.width - margin, self.page_h - bottom_right.height - margin), bottom_right)
 
     def draw_decor_three_hlines(self, draw, y, margin, thickness, inner_margins):
         '''
@@ -162,13 +502,12 @@ class TearOffCalendarBaseSheet:
 
     def draw_wifi(self, page, wifi_qlt, x, y):
         wifi_qlt = str(wifi_qlt) if wifi_qlt else 'off'
-        wifi = Image.open(os.path.join(self.icons_path, 'wifi', 'wifi_' + wifi_qlt + '.png'), mode='r')
+        wifi = assets.get_image(os.path.join(self.icons_path, 'wifi', 'wifi_' + wifi_qlt + '.png'))
         page.paste(wifi, (x, y), wifi)
 
     def draw_battery(self, page, battery, x, y):
-        battery = Image.open(os.path.join(self.icons_path, 'battery', 'battery_' +  ('charging_' if battery['charging'] == 1 else '') + str(battery['level']) + '.png'), mode='r')
-        if str(x).startswith('r-'):
-            x = self.page_w - battery.width - int(x.split('-')[1])
+        battery = assets.get_image(os.path.join(self.icons_path, 'battery', 'battery_' +  ('charging_' if battery['charging'] == 1 else '') + str(battery['level']) + '.png'))
+        x = self.resolve_x(x, battery.width)
         page.paste(battery, (x, y), battery)
 
     def draw_day(self, draw, day, y, fontname, fontsize):
@@ -178,8 +517,8 @@ class TearOffCalendarBaseSheet:
 
         day = str(day)
 
-        day_font = ImageFont.truetype(os.path.join(self.fonts_path, fontname), fontsize)
-        day_w, day_h = draw.textsize(day, font=day_font)
+        day_font = self.font(fontname, fontsize)
+        day_w, day_h = self.textsize(day, fontname, fontsize)
         draw.text(((self.page_w-day_w)/2, y), day, font=day_font)
 
     def draw_month(self, draw, month, x, y, fontname, fontsize):
@@ -189,10 +528,9 @@ class TearOffCalendarBaseSheet:
 
         month = self.MONTHS[month-1].upper()
 
-        month_font = ImageFont.truetype(os.path.join(self.fonts_path, fontname), fontsize)
-        month_w, month_h = draw.textsize(month, font=month_font)
-        if str(x).startswith('c'):
-            x = (self.page_w-month_w) / 2
+        month_font = self.font(fontname, fontsize)
+        month_w, month_h = self.textsize(month, fontname, fontsize)
+        x = self.resolve_x(x, month_w)
         draw.text((x, y), month, font=month_font)
 
     def draw_weekday(self, draw, weekday, x, y, fontname, fontsize):
@@ -202,12 +540,9 @@ class TearOffCalendarBaseSheet:
 
         weekday = self.WEEKDAYS[weekday].upper()
 
-        weekday_font = ImageFont.truetype(os.path.join(self.fonts_path, fontname), fontsize)
-        weekday_w, weekday_h = draw.textsize(weekday, font=weekday_font)
-        if str(x).startswith('c'):
-            x = (self.page_w - weekday_w) / 2
-        elif str(x).startswith('r-'):
-            x = self.page_w - weekday_w - int(x.split('-')[1])
+        weekday_font = self.font(fontname, fontsize)
+        weekday_w, weekday_h = self.textsize(weekday, fontname, fontsize)
+        x = self.resolve_x(x, weekday_w)
         draw.text((x, y), weekday, font=weekday_font)
 
     def draw_holiday_title(self, draw, holiday_title, holiday_type, y, margin, max_height, fontname, fontsize, frame = False):
@@ -221,19 +556,9 @@ class TearOffCalendarBaseSheet:
             holiday_title = '\U00002692 ' + holiday_title
         else:
             holiday_title = holiday_title
-        col = 25
-        holiday_title_arr = textwrap.wrap(holiday_title, width=col)
-        while len(holiday_title_arr) > 2:
-            col += 5
-            holiday_title_arr = textwrap.wrap(holiday_title, width=col)
-        holiday_title = '\n'.join(holiday_title_arr)
-        holiday_fontsize = fontsize
-        holiday_font = ImageFont.truetype(os.path.join(self.fonts_path, fontname), holiday_fontsize)
-        holiday_w, holiday_h = draw.textsize(holiday_title, font=holiday_font)
-        while self.page_w - holiday_w < margin*2 or holiday_h > max_height:
-            holiday_fontsize -=2
-            holiday_font = ImageFont.truetype(os.path.join(self.fonts_path, fontname), holiday_fontsize)
-            holiday_w, holiday_h = draw.textsize(holiday_title, font=holiday_font)
+        holiday_title = '\n'.join(textfit.wrap_to_lines(holiday_title, 2, 25))
+        holiday_fontsize, holiday_w, holiday_h = textfit.fit_fontsize(os.path.join(self.fonts_path, fontname), holiday_title, self.page_w - margin*2, max_height, fontsize)
+        holiday_font = self.font(fontname, holiday_fontsize)
         draw.text(((self.page_w-holiday_w)/2, y-holiday_h/2), holiday_title, font=holiday_font, align='center')
 
         if frame:
@@ -244,15 +569,14 @@ class TearOffCalendarBaseSheet:
             Draw sun info
         '''
 
-        icon_font = ImageFont.truetype(os.path.join(self.fonts_path, icon_fontname), icon_fontsize)
+        icon_font = self.font(icon_fontname, icon_fontsize)
         draw.text((icon_x, icon_y), '\U00002609', font=icon_font, fill='black')
 
         sun_info = sun_info_fmt.format(
             sun_info['sunrise'].strftime('%H:%M'),
             sun_info['sunset'].strftime('%H:%M'),
             self.strfdelta(sun_info['daylength'], '%H:%M'))
-        sun_info_font = ImageFont.truetype(os.path.join(self.fonts_path, fontname), fontsize)
-        sun_info_w, sun_info_h = draw.textsize(sun_info, font=sun_info_font)
+        sun_info_font = self.font(fontname, fontsize)
         draw.text((x, y), sun_info, font=sun_info_font, fill='black')
 
     def draw_moon_info(self, draw, moon_info, moon_info_fmt, icon_x, icon_y, icon_fontname, icon_fontsize, x, y, fontname, fontsize):
@@ -260,7 +584,7 @@ class TearOffCalendarBaseSheet:
             Draw sun info
         '''
 
-        icon_font = ImageFont.truetype(os.path.join(self.fonts_path, icon_fontname), icon_fontsize)
+        icon_font = self.font(icon_fontname, icon_fontsize)
         draw.text((icon_x, icon_y), self.MOON_PHASES[moon_info['moon_phase_id']][0], font=icon_font, fill='black')
 
         moon_info = moon_info_fmt.format(
@@ -268,10 +592,11 @@ class TearOffCalendarBaseSheet:
             moon_info['moonrise'].strftime('%H:%M'),
             self.MOON_PHASES[moon_info['moon_phase_id']][1],
             moon_info['moon_day'])
-        moon_info_font = ImageFont.truetype(os.path.join(self.fonts_path, fontname), fontsize)
-        moon_info_w, moon_info_h = draw.textsize(moon_info, font=moon_info_font)
-        if str(x).startswith('r-'):
-            x = self.page_w - moon_info_w - int(x.split('-')[1])
+        moon_info_font = self.font(fontname, fontsize)
+        x = parse_anchor(x)
+        if isinstance(x, Anchor) and x.side == 'r':
+            moon_info_w, moon_info_h = self.textsize(moon_info, fontname, fontsize)
+            x = self.resolve_x(x, moon_info_w)
             align = 'right'
         else:
             align = 'left'
@@ -284,69 +609,79 @@ class TearOffCalendarBaseSheet:
 
         cons = 'Луна в созвездии {}'.format(self.CONSTELLATIONS[cons])
 
-        cons_font = ImageFont.truetype(os.path.join(self.fonts_path, fontname), fontsize)
-        cons_w, cons_h = draw.textsize(cons, font=cons_font)
+        cons_font = self.font(fontname, fontsize)
+        cons_w, cons_h = self.textsize(cons, fontname, fontsize)
         draw.text(((self.page_w-cons_w)/2, y), cons, font=cons_font)
 
-    def draw_forecast(self, page, draw, forecast, y, margin, parts_h, fontname, fontsize, frame = False):
+    def draw_forecast_frame(self, draw, y, margin, parts_h):
         '''
-            Draw weather forecast
+            Draw weather forecast grid
         '''
 
         part_w = int((self.page_w - margin * 2) / 4)
         height = sum(parts_h)
 
-        if frame:
-            draw.rectangle((margin, y, self.page_w - margin, y + height), outline = 0)
+        draw.rectangle((margin, y, self.page_w - margin, y + height), outline = 0)
 
-            draw.line((margin + part_w, y, margin + part_w, y + height), fill = 0)
-            draw.line((margin + 2 * part_w, y, margin + 2 * part_w, y + height), fill = 0)
-            draw.line((margin + 3 * part_w, y, margin + 3 * part_w, y + height), fill = 0)
+        draw.line((margin + part_w, y, margin + part_w, y + height), fill = 0)
+        draw.line((margin + 2 * part_w, y, margin + 2 * part_w, y + height), fill = 0)
+        draw.line((margin + 3 * part_w, y, margin + 3 * part_w, y + height), fill = 0)
 
-            part_y = y
-            for part_h in parts_h:
-                part_y += part_h
-                draw.line((margin, part_y, self.page_w - margin, part_y), fill = 0)
+        part_y = y
+        for part_h in parts_h:
+            part_y += part_h
+            draw.line((margin, part_y, self.page_w - margin, part_y), fill = 0)
+
+    def draw_forecast(self, page, draw, forecast, y, margin, parts_h, fontname, fontsize, frame = False):
+        '''
+            Draw weather forecast
+        '''
+
+        part_w = int((self.page_w - margin * 2) / 4)
+
+        if frame:
+            self.draw_forecast_frame(draw, y, margin, parts_h)
 
         temp_fontsize = []
         for part in forecast['order']:
             temp_fontsize.append(self.adjust_fontsize_by_width(draw, part_w, fontname, fontsize, forecast['parts'][part]['temp']))
         temp_fontsize = min(temp_fontsize)
 
-        day_part_font = ImageFont.truetype(os.path.join(self.fonts_path, fontname), fontsize)
-        temp_font = ImageFont.truetype(os.path.join(self.fonts_path, fontname), temp_fontsize)
+        day_part_font = self.font(fontname, fontsize)
+        temp_font = self.font(fontname, temp_fontsize)
 
         if len(parts_h) >= 4:
             wind_speed = ' {} м/с'.format(forecast['parts'][part]['wind_speed'])
-            wind_icon = Image.open(os.path.join(self.clip_path, 'wind_direction.png'), mode='r')
+            wind_icon_path = os.path.join(self.clip_path, 'wind_direction.png')
+            wind_icon = assets.get_image(wind_icon_path)
             wind_speed_fontsize = []
             for part in forecast['order']:
                 wind_speed_fontsize.append(self.adjust_fontsize_by_width(draw, part_w - wind_icon.width, fontname, int(fontsize*0.85), wind_speed))
             wind_speed_fontsize = min(wind_speed_fontsize)
-            wind_speed_font = ImageFont.truetype(os.path.join(self.fonts_path, fontname), wind_speed_fontsize)
+            wind_speed_font = self.font(fontname, wind_speed_fontsize)
 
         pos = 0
         for part in forecast['order']:
             part_center = margin + part_w/2 + pos
             day_part = self.DAY_PARTS[part]
-            day_part_w, day_part_h = draw.textsize(day_part, font=day_part_font)
+            day_part_w, day_part_h = self.textsize(day_part, fontname, fontsize)
             day_part_x = part_center - day_part_w/2
             draw.text((day_part_x, y-1), day_part, font=day_part_font, fill='black')
 
-            icon = Image.open(os.path.join(self.icons_path, 'weather', forecast['parts'][part]['icon']+'.png'), mode='r')
+            icon = assets.get_image(os.path.join(self.icons_path, 'weather', forecast['parts'][part]['icon']+'.png'))
             icon_x = part_center - icon.width/2
             icon_y = y + parts_h[0] + (parts_h[1] - icon.height)/2 + 0.5
             page.paste(icon, (int(icon_x), int(icon_y)), icon)
 
             temp = forecast['parts'][part]['temp']
-            temp_w, temp_h = draw.textsize(temp, font=temp_font)
+            temp_w, temp_h = self.textsize(temp, fontname, temp_fontsize)
             temp_x = part_center - temp_w/2
             temp_y = y + sum(parts_h[:2]) + (parts_h[2] - temp_h)/2
             draw.text((int(temp_x), int(temp_y)), temp, font=temp_font, fill='black')
 
             if len(parts_h) >= 4:
-                _wind_icon = wind_icon.rotate((forecast['parts'][part]['wind_deg'] +180) % 360)
-                wind_speed_w, wind_speed_h = draw.textsize(wind_speed, font=wind_speed_font)
+                _wind_icon = assets.rotated(wind_icon_path, (forecast['parts'][part]['wind_deg'] +180) % 360)
+                wind_speed_w, wind_speed_h = self.textsize(wind_speed, fontname, wind_speed_fontsize)
                 wind_icon_x = part_center - (_wind_icon.width + wind_speed_w)/2
                 wind_icon_y = y + sum(parts_h[:3]) + (parts_h[3] - _wind_icon.height)/2
                 wind_speed_x = wind_icon_x + _wind_icon.width
@@ -357,7 +692,7 @@ class TearOffCalendarBaseSheet:
             pos += part_w
 
     def draw_no_conn(self, page, y):
-        no_conn = Image.open(os.path.join(self.clip_path, 'no_connection.png'), mode='r')
+        no_conn = assets.get_image(os.path.join(self.clip_path, 'no_connection.png'))
         page.paste(no_conn, (int((self.page_w-no_conn.size[0])/2), y+1), no_conn)
 
     def draw_location_name(self, draw, location_name, x, y, fontname, fontsize):
@@ -365,14 +700,10 @@ class TearOffCalendarBaseSheet:
             Draw location name
         '''
 
-        location_name_font = ImageFont.truetype(os.path.join(self.fonts_path, fontname), fontsize)
-        location_name_w, location_name_h = draw.textsize(location_name, font=location_name_font)
-        if str(x).startswith('c'):
-            x = (self.page_w - location_name_w) / 2
-        elif str(x).startswith('r-'):
-            x = self.page_w - location_name_w - int(x.split('-')[1])
-        if str(y).startswith('d-'):
-            y = self.page_h - location_name_h - int(y.split('-')[1])
+        location_name_font = self.font(fontname, fontsize)
+        location_name_w, location_name_h = self.textsize(location_name, fontname, fontsize)
+        x = self.resolve_x(x, location_name_w)
+        y = self.resolve_y(y, location_name_h)
         draw.text((x, y), location_name, font=location_name_font)
 
     def draw_backpage_name(self, draw, backpage_name, x, y, fontname, fontsize):
@@ -380,14 +711,10 @@ class TearOffCalendarBaseSheet:
             Draw back page source name
         '''
 
-        backpage_name_font = ImageFont.truetype(os.path.join(self.fonts_path, fontname), fontsize)
-        backpage_name_w, backpage_name_h = draw.textsize(backpage_name, font=backpage_name_font)
-        if str(x).startswith('c'):
-            x = (self.page_w - backpage_name_w) / 2
-        elif str(x).startswith('r-'):
-            x = self.page_w - backpage_name_w - int(x.split('-')[1])
-        if str(y).startswith('d-'):
-            y = self.page_h - backpage_name_h - int(y.split('-')[1])
+        backpage_name_font = self.font(fontname, fontsize)
+        backpage_name_w, backpage_name_h = self.textsize(backpage_name, fontname, fontsize)
+        x = self.resolve_x(x, backpage_name_w)
+        y = self.resolve_y(y, backpage_name_h)
         draw.text((x, y), backpage_name, font=backpage_name_font)
 
     def save(self):
@@ -395,35 +722,121 @@ class TearOffCalendarBaseSheet:
             Save images
         '''
 
-        if self.screen:
-            self.pages[self.BLACK].save(os.path.join(self.image_path, 'sheet_b.png'))
-            self.pages[self.RED].save(os.path.join(self.image_path, 'sheet_r.png'))
-            logger.info('Images for EPD saved to files.')
-        else:
-            self.pages[self.BLACK].save(os.path.join(self.image_path, 'sheet.png'))
-            logger.info('There is no EPD. Image saved to file.')
+        with metrics.span('save'):
+            if self.screen:
+                self.buffers = (
+                            self.pack(self.pages[self.BLACK]),
+                            self.pack(self.pages[self.RED])
+                        )
+                framebuffer.write(os.path.join(self.image_path, framebuffer.FRONT_BLACK), self.buffers[self.BLACK])
+                framebuffer.write(os.path.join(self.image_path, framebuffer.FRONT_RED), self.buffers[self.RED])
+                logger.info('Buffers for EPD saved to files.')
+                if self.debug_png:
+                    self.pages[self.BLACK].save(os.path.join(self.image_path, 'sheet_b.png'))
+                    self.pages[self.RED].save(os.path.join(self.image_path, 'sheet_r.png'))
+                    logger.info('Images for EPD saved to files.')
+            else:
+                self.pages[self.BLACK].save(os.path.join(self.image_path, 'sheet.png'))
+                logger.info('There is no EPD. Image saved to file.')
 
-    def display_front(self):
+    def pack(self, page):
+        return packing.pack_1bit(page, self.epd.width, self.epd.height, invert=self.hw_screen[0] in packing.INVERTED_1BIT)
+
+    def front_buffers(self):
+        '''
+            Packed front buffers: rendered in this process, saved raw or saved as images
+        '''
+
+        if self.buffers is not None:
+            return self.buffers
+        size = framebuffer.buffer_size(self.epd)
+        buffers = (
+                    framebuffer.read(os.path.join(self.image_path, framebuffer.FRONT_BLACK), size),
+                    framebuffer.read(os.path.join(self.image_path, framebuffer.FRONT_RED), size)
+                )
+        if None not in buffers:
+            logger.debug('Buffers for EPD loaded from files')
+            return buffers
+        pageBlack = Image.open(os.path.join(self.image_path, 'sheet_b.png'))
+        pageRed = Image.open(os.path.join(self.image_path, 'sheet_r.png'))
+        return (self.pack(pageBlack), self.pack(pageRed))
+
+    def shown_buffers(self):
+        size = framebuffer.buffer_size(self.epd)
+        return (
+                    framebuffer.read(os.path.join(self.image_path, framebuffer.SHOWN_BLACK), size),
+                    framebuffer.read(os.path.join(self.image_path, framebuffer.SHOWN_RED), size)
+                )
+
+    def forget_shown_buffers(self):
+        framebuffer.remove(os.path.join(self.image_path, framebuffer.SHOWN_BLACK))
+        framebuffer.remove(os.path.join(self.image_path, framebuffer.SHOWN_RED))
+
+    def changed_regions(self, shown, buffers):
+        '''
+            Changed areas of both planes, None if nothing is known about shown image
+        '''
+
+        if None in shown:
+            return None
+        regions = []
+        for old, new in zip(shown, buffers):
+            regions += framebuffer.diff_regions(old, new, self.epd.width, self.epd.height)
+        return regions
+
+    def display_partial(self, region, bufBlack, bufRed):
+        '''
+            Partial update for drivers providing one, False if not supported
+        '''
+
+        if not hasattr(self.epd, 'display_Partial') or not hasattr(self.epd, 'init_part'):
+            return False
+        (x0, y0, x1, y1), window = framebuffer.crop(bufBlack, self.epd.width, region)
+        logger.info('EPD partial update of {}'.format(region))
+        with metrics.span('epd_init'):
+            self.epd.init_part()
+        with metrics.span('epd_display'):
+            self.epd.display_Partial(bytearray(window), x0, y0, x1, y1)
+        return True
+
+    def display_front(self, force = False):
         if self.screen:
             try:
-                pageBlack = Image.open(os.path.join(self.image_path, 'sheet_b.png'))
-                pageRed = Image.open(os.path.join(self.image_path, 'sheet_r.png'))
+                bufBlack, bufRed = self.front_buffers()
 
-                logger.info('EPD rendering started')
-                self.epd.init()
-                logger.debug('EPD Init done')
-                self.epd.Clear()
-                logger.debug('EPD Clear done')
+                shown = self.shown_buffers()
+                regions = None if force else self.changed_regions(shown, (bufBlack, bufRed))
+                if regions == []:
+                    logger.info('EPD already shows this sheet, refresh skipped')
+                    return
+                if regions is not None:
+                    logger.debug('EPD changed regions: {}'.format(regions))
 
-                logger.debug('EPD Display')
-                self.epd.display(self.epd.getbuffer(pageBlack), self.epd.getbuffer(pageRed))
+                logger.info('EPD rendering started')
+                # Red plane has no partial update.
+                if not (regions is not None and shown[self.RED] == bufRed and self.display_partial(framebuffer.union(regions), bufBlack, bufRed)):
+                    with metrics.span('epd_init'):
+                        self.epd.init()
+                    logger.debug('EPD Init done')
+                    with metrics.span('epd_clear'):
+                        self.epd.Clear()
+                    logger.debug('EPD Clear done')
+
+                    logger.debug('EPD Display')
+                    with metrics.span('epd_display'):
+                        self.epd.display(bytearray(bufBlack), bytearray(bufRed))
 
                 logger.debug('Sleep')
                 time.sleep(1)
                 logger.debug('EPD Sleep')
-                self.epd.sleep()
+                with metrics.span('epd_sleep'):
+                    self.epd.sleep()
+
+                framebuffer.write(os.path.join(self.image_path, framebuffer.SHOWN_BLACK), bufBlack)
+                framebuffer.write(os.path.join(self.image_path, framebuffer.SHOWN_RED), bufRed)
             except IOError as e:
-                logger.error('EPD rendering failed with error: ' + e)
+                logger.error('EPD rendering failed with error: {}'.format(e))
+                self.forget_shown_buffers()
             else:
                 logger.info('EPD rendering completed successfully')
         else:
@@ -433,22 +846,27 @@ class TearOffCalendarBaseSheet:
         if self.screen:
             try:
                 page = Image.open(os.path.join(self.image_path, 'backsheet.png'))
+                self.forget_shown_buffers()
 
                 logger.info('EPD rendering started')
-                self.epd_b.Init_4Gray()
+                with metrics.span('epd_init'):
+                    self.epd_b.Init_4Gray()
                 logger.debug('EPD Init done')
-                self.epd_b.Clear()
+                with metrics.span('epd_clear'):
+                    self.epd_b.Clear()
                 logger.debug('EPD Clear done')
 
                 logger.debug('EPD Display')
-                self.epd_b.display_4Gray(self.epd_b.getbuffer_4Gray(page))
+                with metrics.span('epd_display'):
+                    self.epd_b.display_4Gray(bytearray(packing.pack_4gray(page, self.epd_b.width, self.epd_b.height)))
 
                 logger.debug('Sleep')
                 time.sleep(1)
                 logger.debug('EPD Sleep')
-                self.epd.sleep()
+                with metrics.span('epd_sleep'):
+                    self.epd_b.sleep()
             except IOError as e:
-                logger.error('EPD rendering failed with error: ' + e)
+                logger.error('EPD rendering failed with error: {}'.format(e))
             else:
                 logger.info('EPD rendering completed successfully')
         else:
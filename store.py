@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+
+logger = logging.getLogger(__name__)
+
+STORE_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'store')
+STORE_FILE = 'pytoc.sqlite'
+# Days rows are kept for, by time they are about.
+FORECAST_RETENTION = 14
+SAMPLE_RETENTION = 90
+# Decimal places of coordinates, about 1 km.
+PRECISION = 2
+
+FORECAST_FIELDS = ('temp', 'humidity', 'pressure', 'wind_speed', 'wind_deg', 'cast', 'description', 'code', 'icon')
+# Quoted as CAST is SQL keyword.
+FORECAST_COLUMNS = ', '.join('"{}"'.format(field) for field in FORECAST_FIELDS)
+
+# Forecast keeps the latest fetch of each hour, samples are appended.
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS forecast (
+    provider TEXT NOT NULL,
+    lat REAL NOT NULL,
+    lon REAL NOT NULL,
+    ts INTEGER NOT NULL,
+    fetched REAL NOT NULL,
+    {},
+    PRIMARY KEY (provider, lat, lon, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sample (
+    sensor TEXT NOT NULL,
+    ts REAL NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (sensor, ts)
+) WITHOUT ROWID;
+'''.format(FORECAST_COLUMNS)
+
+_lock = threading.Lock()
+_ready = set()
+
+def connect(path = STORE_PATH):
+    '''
+        New connection to store, database is created on first use
+    '''
+
+    filename = os.path.join(path, STORE_FILE)
+    with _lock:
+        if filename not in _ready:
+            os.makedirs(path, exist_ok=True)
+            with sqlite3.connect(filename) as db:
+                # Readers do not block the writer and commits do not wait for fsync of database.
+                db.execute('PRAGMA journal_mode=WAL')
+                db.executescript(SCHEMA)
+            _ready.add(filename)
+    db = sqlite3.connect(filename, timeout=5)
+    db.execute('PRAGMA synchronous=NORMAL')
+    return db
+
+def location(coord):
+    return round(float(coord[0]), PRECISION), round(float(coord[1]), PRECISION)
+
+def add_forecast(provider, coord, fetched, records, path = STORE_PATH):
+    '''
+        Store hourly (Unix time, record) pairs of provider response
+    '''
+
+    lat, lon = location(coord)
+    rows = [(provider, lat, lon, int(ts), fetched) + tuple(record.get(f) for f in FORECAST_FIELDS) for ts, record in records]
+    try:
+        db = connect(path)
+        try:
+            with db:
+                db.executemany('INSERT OR REPLACE INTO forecast VALUES ({})'.format(','.join('?' * (5 + len(FORECAST_FIELDS)))), rows)
+                db.execute('DELETE FROM forecast WHERE ts < ?', (time.time() - FORECAST_RETENTION * 86400,))
+        finally:
+            db.close()
+    except (sqlite3.Error, OSError) as e:
+        logger.warning('Forecast not stored: {}'.format(e))
+
+def add_samples(samples, ts = None, path = STORE_PATH):
+    '''
+        Store sensor readings of dict sensor: value taken at Unix time ts
+    '''
+
+    ts = time.time() if ts is None else ts
+    try:
+        db = connect(path)
+        try:
+            with db:
+                db.executemany('INSERT OR REPLACE INTO sample VALUES (?,?,?)', ((sensor, ts, value) for sensor, value in samples.items()))
+                db.execute('DELETE FROM sample WHERE ts < ?', (ts - SAMPLE_RETENTION * 86400,))
+        finally:
+            db.close()
+    except (sqlite3.Error, OSError) as e:
+        logger.warning('Samples not stored: {}'.format(e))
+
+def forecast(provider, coord, start, end, path = STORE_PATH):
+    '''
+        Hourly (Unix time, record) pairs within [start, end] sorted by time,
+        fit for forecast.aggregate
+    '''
+
+    lat, lon = location(coord)
+    db = connect(path)
+    try:
+        rows = db.execute('SELECT ts, {} FROM forecast WHERE provider = ? AND lat = ? AND lon = ? AND ts BETWEEN ? AND ? ORDER BY ts'.format(FORECAST_COLUMNS),
+                          (provider, lat, lon, start, end)).fetchall()
+    finally:
+        db.close()
+    return [(row[0], {f: v for f, v in zip(FORECAST_FIELDS, row[1:]) if v is not None}) for row in rows]
+
+def samples(sensor, start, end, path = STORE_PATH):
+    '''
+        (Unix time, value) readings of sensor within [start, end] sorted by time
+    '''
+
+    db = connect(path)
+    try:
+        return db.execute('SELECT ts, value FROM sample WHERE sensor = ? AND ts BETWEEN ? AND ? ORDER BY ts', (sensor, start, end)).fetchall()
+    finally:
+        db.close()
+
+def main():
+    parser = argparse.ArgumentParser(prog='store.py', description='Stored forecasts and sensor readings')
+    parser.add_argument('-s', '--sensor', dest='sensor', help='sensor readings to show: battery, voltage, current, wifi')
+    parser.add_argument('-p', '--provider', dest='provider', help='forecast of provider to show')
+    parser.add_argument('-c', '--coord', dest='coord', help='comma separated latitude and longitude of forecast', default='55.755864,37.617698')
+    parser.add_argument('-H', '--hours', dest='hours', help='hours back and ahead of now to show', type=float, default=24)
+    args = parser.parse_args()
+
+    now = time.time()
+    start, end = now - args.hours * 3600, now + args.hours * 3600
+    if args.sensor:
+        for ts, value in samples(args.sensor, start, end):
+            print(time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts)), value)
+    if args.provider:
+        for ts, record in forecast(args.provider, args.coord.split(','), start, end):
+            print(time.strftime('%Y-%m-%d %H:%M', time.localtime(ts)), record)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import tempfile
+import unittest
+from datetime import date, datetime
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+import astro
+
+try:
+    import ephem
+except ImportError:
+    ephem = None
+
+LATITUDE, LONGITUDE = '55.755864', '37.617698'
+YEAR = 2026
+
+@unittest.skipIf(ephem is None, 'ephem is not installed')
+class TableTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.path = cls.tmp.name
+        astro.prepare(LATITUDE, LONGITUDE, date(YEAR, 6, 1), cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_record_is_of_noon(self):
+        day = date(YEAR, 3, 20)
+        record = astro.lookup(LATITUDE, LONGITUDE, day, self.path)
+        self.assertEqual(record, astro.compute(LATITUDE, LONGITUDE, datetime(YEAR, 3, 20, 12)))
+
+    def test_valid_table_is_not_built_again(self):
+        self.assertEqual(astro.prepare(LATITUDE, LONGITUDE, date(YEAR, 6, 1), self.path), [])
+
+    def test_next_year_is_built_ahead(self):
+        with mock.patch.object(astro, 'build') as build:
+            astro.prepare(LATITUDE, LONGITUDE, date(YEAR, 12, 20), self.path)
+        build.assert_called_once_with(LATITUDE, LONGITUDE, YEAR + 1, self.path)
+
+    def test_other_time_zone_is_not_used(self):
+        winter, summer = astro.utc_offsets(YEAR)
+        with mock.patch.object(astro, 'utc_offsets', return_value=(winter + 3600, summer + 3600)):
+            self.assertIsNone(astro.lookup(LATITUDE, LONGITUDE, date(YEAR, 3, 20), self.path))
+
+    def test_miss_is_computed_without_building(self):
+        with mock.patch.object(astro, 'build') as build:
+            sun_info, moon_info = astro.get(LATITUDE, LONGITUDE, datetime(YEAR + 5, 3, 20, 8), self.path)
+        build.assert_not_called()
+        self.assertLess(sun_info['sunrise'], sun_info['sunset'])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import sys
+import json
+import types
+import importlib
+import tracemalloc
+import unittest
+from unittest import mock
+
+p = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')
+sys.path.insert(0, p)
+sys.path.insert(0, os.path.join(p, 'bench'))
+
+# API keys are not needed to parse responses and cfg modules are encrypted in checkout.
+for name, attr in (('owm_cfg', 'api_key'), ('gm_cfg', 'token'), ('yw_cfg', 'access_key')):
+    try:
+        importlib.import_module(name)
+    except (ImportError, SyntaxError, ValueError):
+        module = types.ModuleType(name)
+        setattr(module, attr, '')
+        sys.modules[name] = module
+
+import registry
+import forecast
+from replay import synthetic
+
+# Ten days of hourly forecast, as providers return it.
+HOURS = 240
+NOW = 1790000000 // 3600 * 3600
+PROVIDERS = {'owm': 'OWM', 'gm': 'GM', 'yw': 'YW'}
+
+def peak(function, *args):
+    tracemalloc.start()
+    try:
+        result = function(*args)
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+@unittest.skipIf(forecast.ijson is None, 'ijson is not installed')
+class StreamParseTest(unittest.TestCase):
+
+    def test_summary_and_peak_memory(self):
+        for name, provider_name in PROVIDERS.items():
+            with self.subTest(provider=name):
+                provider = registry.weather_provider(provider_name)()
+                body = json.dumps(synthetic(name, HOURS, NOW)).encode('utf-8')
+                until = provider.window(NOW)[1] + forecast.PARSE_AHEAD
+
+                full, full_peak = peak(json.loads, body)
+                streamed, stream_peak = peak(provider.parse, io.BytesIO(body), until)
+
+                self.assertTrue(provider.valid(streamed))
+                self.assertEqual(provider.summarize(streamed, NOW), provider.summarize(full, NOW))
+                self.assertLess(stream_peak, full_peak)
+
+class HTTPErrorTest(unittest.TestCase):
+
+    def test_server_error_falls_back_to_cache(self):
+        provider = registry.weather_provider('OWM')()
+        now = NOW + 2 * 3600
+        entry = {'data': synthetic('owm', 48, NOW), 'fetched': NOW}
+        response = mock.Mock(status_code=503)
+        with mock.patch.object(forecast.weather_cache, 'load', return_value=entry), \
+                mock.patch.object(forecast.weather_cache, 'save'), \
+                mock.patch.object(forecast.time, 'time', return_value=now), \
+                mock.patch.object(provider, 'request', return_value=response), \
+                mock.patch.object(provider, 'parse') as parse:
+            result = provider.get_forecast(('55.7559', '37.6177'))
+        parse.assert_not_called()
+        response.json.assert_not_called()
+        response.close.assert_called_once()
+        self.assertEqual(result, provider.summarize(entry['data'], now))
+        self.assertEqual(provider.stale_since, NOW)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+import framebuffer
+
+class CropTest(unittest.TestCase):
+    # 32x4 panel, byte of buffer is its column * 16 + row.
+    WIDTH = 32
+    BUF = bytes(x * 16 + y for y in range(4) for x in range(4))
+
+    def test_window_is_cropped(self):
+        region, window = framebuffer.crop(self.BUF, self.WIDTH, (8, 1, 23, 2))
+        self.assertEqual(region, (8, 1, 24, 3))
+        self.assertEqual(window, bytes([0x11, 0x21, 0x12, 0x22]))
+
+    def test_x_is_aligned_to_bytes(self):
+        region, window = framebuffer.crop(self.BUF, self.WIDTH, (3, 0, 9, 0))
+        self.assertEqual(region, (0, 0, 16, 1))
+        self.assertEqual(window, bytes([0x00, 0x10]))
+
+    def test_full_frame(self):
+        region, window = framebuffer.crop(self.BUF, self.WIDTH, (0, 0, 31, 3))
+        self.assertEqual(region, (0, 0, 32, 4))
+        self.assertEqual(window, self.BUF)
+
+    def test_diff_regions_crop(self):
+        new = bytearray(self.BUF)
+        new[2 * 4 + 1] ^= 0xFF
+        new[3 * 4 + 2] ^= 0x01
+        region = framebuffer.union(framebuffer.diff_regions(self.BUF, new, self.WIDTH, 4))
+        region, window = framebuffer.crop(new, self.WIDTH, region)
+        self.assertEqual(region, (8, 2, 24, 4))
+        self.assertEqual(window, bytes([new[9], new[10], new[13], new[14]]))
+
+if __name__ == "__main__":
+    unittest.main()
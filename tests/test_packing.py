@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import random
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from PIL import Image
+import packing
+
+# Drivers of these panels, front and back.
+PANELS = ((400, 300), (800, 480))
+
+def reference_getbuffer(image, width, height):
+    # waveshare_epd.epd4in2bc.EPD.getbuffer
+    buf = [0xFF] * (int(width/8) * height)
+    image_monocolor = image.convert('1')
+    imwidth, imheight = image_monocolor.size
+    pixels = image_monocolor.load()
+    if(imwidth == width and imheight == height):
+        for y in range(imheight):
+            for x in range(imwidth):
+                if pixels[x, y] == 0:
+                    buf[int((x + y * width) / 8)] &= ~(0x80 >> (x % 8))
+    elif(imwidth == height and imheight == width):
+        for y in range(imheight):
+            for x in range(imwidth):
+                newx = y
+                newy = height - x - 1
+                if pixels[x, y] == 0:
+                    buf[int((newx + newy*width) / 8)] &= ~(0x80 >> (y % 8))
+    return bytes(buf)
+
+def reference_getbuffer_4gray(image, width, height):
+    # waveshare_epd.epd4in2.EPD.getbuffer_4Gray
+    buf = [0xFF] * (int(width / 4) * height)
+    image_monocolor = image.convert('L')
+    imwidth, imheight = image_monocolor.size
+    pixels = image_monocolor.load()
+    i=0
+    if(imwidth == width and imheight == height):
+        for y in range(imheight):
+            for x in range(imwidth):
+                if(pixels[x, y] == 0xC0):
+                    pixels[x, y] = 0x80
+                elif (pixels[x, y] == 0x80):
+                    pixels[x, y] = 0x40
+                i= i+1
+                if(i%4 == 0):
+                    buf[int((x + (y * width))/4)] = ((pixels[x-3, y]&0xc0) | (pixels[x-2, y]&0xc0)>>2 | (pixels[x-1, y]&0xc0)>>4 | (pixels[x, y]&0xc0)>>6)
+    elif(imwidth == height and imheight == width):
+        for x in range(imwidth):
+            for y in range(imheight):
+                newx = y
+                newy = height - x - 1
+                if(pixels[x, y] == 0xC0):
+                    pixels[x, y] = 0x80
+                elif (pixels[x, y] == 0x80):
+                    pixels[x, y] = 0x40
+                i= i+1
+                if(i%4 == 0):
+                    buf[int((newx + (newy * width))/4)] = ((pixels[x, y-3]&0xc0) | (pixels[x, y-2]&0xc0)>>2 | (pixels[x, y-1]&0xc0)>>4 | (pixels[x, y]&0xc0)>>6)
+    return bytes(buf)
+
+def page(size, seed = 0):
+    '''
+        Page of 4-gray levels the drivers map and of any other ones
+    '''
+
+    rnd = random.Random(seed)
+    image = Image.new('L', size, 255)
+    image.putdata([rnd.choice((0x00, 0x40, 0x80, 0xC0, 0xFF, rnd.randrange(256))) for _ in range(size[0] * size[1])])
+    return image
+
+class PackTest(unittest.TestCase):
+    '''
+        Packed buffers are the same as ones of waveshare drivers,
+        for pages of panel size and turned by 90 degrees
+    '''
+
+    def sizes(self):
+        for width, height in PANELS:
+            for size in ((width, height), (height, width)):
+                yield width, height, size
+
+    def test_1bit(self):
+        for width, height, size in self.sizes():
+            with self.subTest(panel=(width, height), page=size):
+                image = page(size).convert('1')
+                self.assertEqual(packing.pack_1bit(image, width, height), reference_getbuffer(image, width, height))
+
+    def test_1bit_inverted(self):
+        image = page((400, 300)).convert('1')
+        expected = bytes(b ^ 0xFF for b in reference_getbuffer(image, 400, 300))
+        self.assertEqual(packing.pack_1bit(image, 400, 300, invert=True), expected)
+
+    def test_4gray(self):
+        for width, height, size in self.sizes():
+            with self.subTest(panel=(width, height), page=size):
+                image = page(size)
+                self.assertEqual(packing.pack_4gray(image, width, height), reference_getbuffer_4gray(image.copy(), width, height))
+
+    def test_4gray_without_numpy(self):
+        image = page((300, 400))
+        with mock.patch.dict(sys.modules, {'numpy': None}):
+            buf = packing.pack_4gray(image, 400, 300)
+        self.assertEqual(buf, reference_getbuffer_4gray(image.copy(), 400, 300))
+
+    def test_size_mismatch(self):
+        with self.assertRaises(ValueError):
+            packing.pack_1bit(Image.new('1', (100, 100)), 400, 300)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from PIL import Image
+from backpage import pool
+
+class Offline:
+    name = 'offline'
+
+    def get(self):
+        raise AssertionError('network is used')
+
+    fetch = get
+
+class TakeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_empty_pool_raises_system_error(self):
+        with self.assertRaises(SystemError):
+            pool.take(Offline(), self.path)
+
+    def test_item_is_taken_from_pool(self):
+        pool.Pool(Offline.name, self.path).put(('title', Image.new('1', (8, 8), 0), 'text'))
+        title, image, text = pool.take(Offline(), self.path)
+        self.assertEqual((title, image.size, text), ('title', (8, 8), 'text'))
+        with self.assertRaises(SystemError):
+            pool.take(Offline(), self.path)
+
+if __name__ == "__main__":
+    unittest.main()
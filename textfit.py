@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import textwrap
+from functools import lru_cache
+import fonts
+
+logger = logging.getLogger(__name__)
+
+FIT_CACHE_SIZE = 512
+
+@lru_cache(maxsize=FIT_CACHE_SIZE)
+def fit_fontsize(path, text, max_w, max_h = None, max_size = 24, min_size = 1):
+    '''
+        Find the largest font size fitting text into the box by bisection.
+        Returns (size, text_w, text_h). If nothing fits min_size is returned.
+    '''
+
+    def fits(size):
+        text_w, text_h = fonts.textsize(path, size, text)
+        return text_w <= max_w and (max_h is None or text_h <= max_h)
+
+    lo, hi = min_size, max_size
+    if fits(hi):
+        lo = hi
+    else:
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if fits(mid):
+                lo = mid
+            else:
+                hi = mid
+    logger.debug('Font size {} fits {}x{}'.format(lo, max_w, max_h))
+    return (lo,) + tuple(fonts.textsize(path, lo, text))
+
+@lru_cache(maxsize=FIT_CACHE_SIZE)
+def wrap_to_lines(text, lines, min_width = 1):
+    '''
+        Wrap text into at most given number of lines using the narrowest
+        wrap width not less than min_width. Returns list of lines.
+    '''
+
+    lo, hi = max(min_width, 1), max(min_width, len(text), 1)
+    if len(textwrap.wrap(text, width=lo)) <= lines:
+        return textwrap.wrap(text, width=lo)
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if len(textwrap.wrap(text, width=mid)) <= lines:
+            hi = mid
+        else:
+            lo = mid
+    return textwrap.wrap(text, width=hi)
+
+@lru_cache(maxsize=FIT_CACHE_SIZE)
+def fit_wrapped(path, text, max_w, max_h, max_size, max_lines, min_lines = 1):
+    '''
+        Choose line count and font size giving the largest font for text
+        wrapped into the box. Returns (text, size, text_w, text_h).
+    '''
+
+    best = None
+    for lines in range(min_lines, max_lines + 1):
+        wrapped = '\n'.join(wrap_to_lines(text, lines, len(text) // lines))
+        size, text_w, text_h = fit_fontsize(path, wrapped, max_w, max_h, max_size)
+        if best is None or size > best[1]:
+            best = (wrapped, size, text_w, text_h)
+    return best
+
+def cache_clear():
+    fit_wrapped.cache_clear()
+    wrap_to_lines.cache_clear()
+    fit_fontsize.cache_clear()
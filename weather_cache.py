@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+CACHE_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'cache')
+# Forecast younger than this is used without request.
+TTL = 60 * 60
+# Forecast older than this is not shown even if network is down.
+MAX_STALE = 24 * 60 * 60
+# Decimal places of coordinates in key, about 1 km.
+PRECISION = 2
+
+def key(provider, coord):
+    return '{}_{:.{p}f}_{:.{p}f}'.format(provider, float(coord[0]), float(coord[1]), p=PRECISION)
+
+def load(provider, coord, path = CACHE_PATH):
+    '''
+        Cached entry of provider forecast for coordinates, None if missing or broken
+    '''
+
+    try:
+        with open(os.path.join(path, key(provider, coord) + '.json'), encoding='utf-8') as f:
+            entry = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning('Forecast cache not read: {}'.format(e))
+        return None
+    if not isinstance(entry, dict) or 'data' not in entry or 'fetched' not in entry:
+        return None
+    return entry
+
+def save(provider, coord, entry, path = CACHE_PATH):
+    '''
+        Store entry: raw response 'data' fetched at Unix time 'fetched',
+        its 'etag' and 'last_modified' validators and 'summary' for window
+        starting at 'summarized'
+    '''
+
+    filename = os.path.join(path, key(provider, coord) + '.json')
+    try:
+        os.makedirs(path, exist_ok=True)
+        with open(filename + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(filename + '.tmp', filename)
+    except OSError as e:
+        logger.warning('Forecast cache not saved: {}'.format(e))